@@ -0,0 +1,131 @@
+# Copyright (c) 2016 Clarence Ho (clarenceho at gmail dot com)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+from deadline import bind_context
+
+# scrapes of one bulkhead running at the same time
+BULKHEAD_WORKERS = 2
+# scrapes of one bulkhead waiting for a worker. More are turned away
+BULKHEAD_QUEUE = 4
+
+
+# name of the bulkhead the current code runs in
+_current = contextvars.ContextVar("bulkhead", default=None)
+
+
+def get_current():
+    """Name of the bulkhead the calling code runs in, None outside of one. Work
+    handed to other threads with bind_context keeps it"""
+    return _current.get()
+
+
+class BulkheadFull(Exception):
+    """The bulkhead can't take more work, or didn't get to it in time"""
+
+
+class Bulkhead:
+    """Bounded executors with a queue limit, one per name.
+
+    Each source scrapes in its own, so that a slow one ties up its own threads
+    instead of every worker of the server. The pages a scrape fetches concurrently
+    go to pools of the same bulkhead too (see sources.base.iter_concurrently).
+    """
+
+    def __init__(self, max_workers=BULKHEAD_WORKERS, max_queue=BULKHEAD_QUEUE):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._lock = threading.Lock()
+        self._executors = {}
+        self._stats = {}
+
+    def submit(self, name, fn):
+        """Queue fn on the executor of name. Raises BulkheadFull if its queue is full"""
+        with self._lock:
+            stats = self._stats.setdefault(
+                name, {"running": 0, "queued": 0, "completed": 0, "rejected": 0}
+            )
+            if stats["running"] + stats["queued"] >= self.max_workers + self.max_queue:
+                stats["rejected"] += 1
+                raise BulkheadFull(f"Bulkhead {name} is full")
+            stats["queued"] += 1
+            executor = self._executors.get(name)
+            if executor is None:
+                executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix="bulkhead-" + name
+                )
+                self._executors[name] = executor
+
+        def _run():
+            _current.set(name)
+            with self._lock:
+                stats["queued"] -= 1
+                stats["running"] += 1
+            try:
+                return fn()
+            finally:
+                with self._lock:
+                    stats["running"] -= 1
+                    stats["completed"] += 1
+
+        def _on_done(future):
+            if future.cancelled():
+                # a cancelled call never ran, so it never left the queue
+                with self._lock:
+                    stats["queued"] -= 1
+
+        future = executor.submit(bind_context(_run))
+        future.add_done_callback(_on_done)
+        return future
+
+    def run(self, name, fn, timeout=None):
+        """Run fn on the executor of name and return its result.
+
+        Raises BulkheadFull if the queue is full or fn didn't start within timeout.
+        Once started, fn is waited for until it returns.
+        """
+        future = self.submit(name, fn)
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            if future.cancel():
+                raise BulkheadFull(f"Bulkhead {name} didn't start in {timeout}s")
+        return future.result()
+
+    def get_stats(self):
+        """Per name scrapes running and waiting, and how full the bulkhead is"""
+        capacity = self.max_workers + self.max_queue
+        with self._lock:
+            return {
+                name: {
+                    **stats,
+                    "occupancy": round(
+                        (stats["running"] + stats["queued"]) / capacity, 2
+                    ),
+                }
+                for name, stats in sorted(
+                    self._stats.items(),
+                    key=lambda item: -(item[1]["running"] + item[1]["queued"]),
+                )
+            }
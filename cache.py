@@ -0,0 +1,397 @@
+# Copyright (c) 2016 Clarence Ho (clarenceho at gmail dot com)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_TTL = 900
+MAX_CACHE_BYTES = 64 * 1024 * 1024
+
+
+class _Flight:
+    """A call in progress that other callers can wait on"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+        # items produced so far by a call of stream. None for a call of do
+        self.items = None
+        self.started = False
+        self.changed = threading.Condition()
+
+
+class SingleFlight:
+    """Coalesce concurrent calls with the same key into a single call"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights = {}
+        self._calls = 0
+        self._shared = 0
+
+    def do(self, key, fn, timeout=None):
+        """Run fn for key, or wait for the identical call already running.
+
+        Waiting longer than timeout (seconds) raises TimeoutError.
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            is_leader = flight is None
+            self._calls += 1
+            if not is_leader:
+                self._shared += 1
+            else:
+                flight = _Flight()
+                self._flights[key] = flight
+
+        if not is_leader:
+            if not flight.done.wait(timeout):
+                raise TimeoutError(f"Call still running after {timeout}s")
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = fn()
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+
+        return flight.value
+
+    def stream(self, key, make_iter, submit, timeout=None, on_done=None):
+        """Yield the items of make_iter(), or of the identical call already running.
+
+        The first caller has submit(fn) run the iteration in the background, so that
+        it goes on for the others if that caller stops reading. Callers joining later
+        get the items produced so far, then follow along; joining a call of do, they
+        get its result once it returns. A call of do joining a stream gets the list
+        of its items. Waiting longer than timeout for the iteration to start raises
+        TimeoutError. If given, on_done(items) is called with that list once the
+        iteration completes.
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            is_leader = flight is None
+            self._calls += 1
+            if not is_leader:
+                self._shared += 1
+            else:
+                flight = _Flight()
+                flight.items = []
+                self._flights[key] = flight
+
+        if is_leader:
+            try:
+                submit(lambda: self._produce(key, flight, make_iter, on_done))
+            except Exception as e:
+                flight.error = e
+                self._land(key, flight)
+                raise
+
+        if flight.items is None:
+            if not flight.done.wait(timeout):
+                raise TimeoutError(f"Call still running after {timeout}s")
+            if flight.error is not None:
+                raise flight.error
+            yield from flight.value
+            return
+
+        with flight.changed:
+            if not flight.changed.wait_for(
+                lambda: flight.started or flight.done.is_set(), timeout
+            ):
+                raise TimeoutError(f"Call not started after {timeout}s")
+        index = 0
+        done = False
+        while not done:
+            with flight.changed:
+                flight.changed.wait_for(
+                    lambda: index < len(flight.items) or flight.done.is_set()
+                )
+                items = flight.items[index:]
+                done = flight.done.is_set()
+            yield from items
+            index += len(items)
+        if flight.error is not None:
+            raise flight.error
+
+    def get_stats(self):
+        """Number of calls, and how many of them waited on an identical one"""
+        with self._lock:
+            return {"calls": self._calls, "shared": self._shared}
+
+    def _produce(self, key, flight, make_iter, on_done):
+        with flight.changed:
+            flight.started = True
+            flight.changed.notify_all()
+        try:
+            for item in make_iter():
+                with flight.changed:
+                    flight.items.append(item)
+                    flight.changed.notify_all()
+            if on_done is not None:
+                on_done(flight.items)
+            flight.value = flight.items
+        except Exception as e:
+            # raised to the callers reading the stream
+            flight.error = e
+        finally:
+            self._land(key, flight)
+
+    def _land(self, key, flight):
+        with self._lock:
+            del self._flights[key]
+        with flight.changed:
+            flight.done.set()
+            flight.changed.notify_all()
+
+
+class _Entry:
+    def __init__(self, value, size, ttl):
+        self.value = value
+        self.size = size
+        self.created = time.monotonic()
+        self.expires = self.created + ttl
+
+    def is_fresh(self, min_fresh=0):
+        return time.monotonic() + min_fresh < self.expires
+
+
+def _estimate_size(value):
+    """Rough estimate of the memory held by a list of sections / articles"""
+    if isinstance(value, (bytes, str)):
+        return len(value)
+    if isinstance(value, dict):
+        return 64 + sum(_estimate_size(v) for v in value.values())
+    if isinstance(value, (list, tuple)):
+        return 64 + sum(_estimate_size(v) for v in value)
+    return 16
+
+
+class ArticleCache:
+    """In-process LRU cache with per-entry TTL and single-flight loading.
+
+    If given, on_put(key, value) is called before a value is stored, so that what
+    it prepares from the value is ready by the time readers get the entry, and
+    on_evict(key, value) once a value is replaced, evicted or invalidated, to drop
+    what was prepared.
+    """
+
+    def __init__(self, max_bytes=MAX_CACHE_BYTES, on_put=None, on_evict=None):
+        self.max_bytes = max_bytes
+        self._on_put = on_put
+        self._on_evict = on_evict
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._total_size = 0
+        self._flight = SingleFlight()
+        self._hits = 0
+        self._stale_hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def get(
+        self,
+        key,
+        loader,
+        ttl=DEFAULT_TTL,
+        on_stale=None,
+        accept=None,
+        min_fresh=0,
+        timeout=None,
+    ):
+        """Return the cached value for key, calling loader once on a miss.
+
+        If on_stale is given, an expired entry is returned as is and on_stale(key)
+        is called to have it refreshed elsewhere. If accept is given and rejects the
+        loaded value, it isn't cached and the expired entry, if any, is returned.
+        An entry expiring within min_fresh seconds counts as expired. Waiting longer
+        than timeout for a load already running raises TimeoutError.
+        """
+        entry = self._lookup(key)
+        if entry is not None and entry.is_fresh(min_fresh):
+            with self._lock:
+                self._hits += 1
+            return entry.value
+
+        if entry is not None and on_stale is not None:
+            with self._lock:
+                self._stale_hits += 1
+            on_stale(key)
+            return entry.value
+
+        with self._lock:
+            self._misses += 1
+        return self._flight.do(
+            key, lambda: self._load(key, loader, ttl, accept, min_fresh), timeout
+        )
+
+    def stream(
+        self,
+        key,
+        make_iter,
+        submit,
+        ttl=DEFAULT_TTL,
+        on_stale=None,
+        accept=None,
+        timeout=None,
+    ):
+        """Yield the items of the cached value for key, or of make_iter() on a miss.
+
+        Like get, but the items of a miss are yielded as they are produced, on the
+        executor of submit, and shared with concurrent gets and streams of key. The
+        list of them is cached at the end unless accept rejects it.
+        """
+        value = self.get_cached(key, on_stale)
+        if value is not None:
+            yield from value
+            return
+
+        with self._lock:
+            self._misses += 1
+
+        def _store(items):
+            if accept is None or accept(items):
+                self.put(key, items, ttl)
+
+        yield from self._flight.stream(key, make_iter, submit, timeout, _store)
+
+    def get_cached(self, key, on_stale=None):
+        """Return the cached value for key, or None without loading it.
+
+        An expired entry counts as missing, unless on_stale is given: then it is
+        returned like in get.
+        """
+        entry = self._lookup(key)
+        if entry is None or not (entry.is_fresh() or on_stale is not None):
+            return None
+        is_fresh = entry.is_fresh()
+        with self._lock:
+            if is_fresh:
+                self._hits += 1
+            else:
+                self._stale_hits += 1
+        if not is_fresh:
+            on_stale(key)
+        return entry.value
+
+    def peek(self, key):
+        """Return (value, seconds until expiry) even if stale; (None, 0) if absent.
+
+        Unlike a get, it leaves the entry where it is in the LRU order.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None:
+            return None, 0
+        return entry.value, entry.expires - time.monotonic()
+
+    def refresh(self, key, loader, ttl=DEFAULT_TTL, accept=None):
+        """Reload key unconditionally, sharing the flight with any concurrent get.
+
+        If accept is given and rejects the new value, the previous entry is kept.
+        """
+
+        def _reload():
+            value = loader()
+            if accept is None or accept(value):
+                self.put(key, value, ttl)
+                return value
+            old, _ = self.peek(key)
+            return old if old is not None else value
+
+        return self._flight.do(key, _reload)
+
+    def put(self, key, value, ttl=DEFAULT_TTL):
+        size = _estimate_size(value)
+        if self._on_put is not None and size <= self.max_bytes:
+            self._on_put(key, value)
+        removed = []
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._total_size -= old.size
+                removed.append((key, old))
+            if size <= self.max_bytes:
+                self._entries[key] = _Entry(value, size, ttl)
+                self._total_size += size
+            while self._total_size > self.max_bytes:
+                evicted_key, evicted = self._entries.popitem(last=False)
+                self._total_size -= evicted.size
+                self._evictions += 1
+                removed.append((evicted_key, evicted))
+        self._removed(removed)
+
+    def invalidate(self, key):
+        removed = []
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._total_size -= old.size
+                removed.append((key, old))
+        self._removed(removed)
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._total_size,
+                "max_bytes": self.max_bytes,
+                "hits": self._hits,
+                "stale_hits": self._stale_hits,
+                "misses": self._misses,
+                "evictions": self._evictions,
+            }
+
+    def _removed(self, removed):
+        # outside the lock: on_evict may take locks of its own
+        if self._on_evict is not None:
+            for key, entry in removed:
+                self._on_evict(key, entry.value)
+
+    def _lookup(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def _load(self, key, loader, ttl, accept=None, min_fresh=0):
+        # another flight may have filled the entry while we were queuing
+        entry = self._lookup(key)
+        if entry is not None and entry.is_fresh(min_fresh):
+            return entry.value
+
+        value = loader()
+        if accept is None or accept(value):
+            self.put(key, value, ttl)
+            return value
+        if entry is not None:
+            with self._lock:
+                self._stale_hits += 1
+            return entry.value
+        return value
@@ -0,0 +1,78 @@
+# Copyright (c) 2016 Clarence Ho (clarenceho at gmail dot com)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import hashlib
+import json
+import os
+
+
+class CassetteStore:
+    """On-disk store of fetched pages, for replaying upstreams offline.
+
+    Each request is kept as <key>.json (what was asked and how long it took) and
+    <key>.body (the bytes returned), where key is a hash of method, url, body,
+    headers and cookies.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def _key(self, method, url, body, headers, cookies):
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        # headers and cookies can change the response, like they do for flights
+        extra = json.dumps([headers or {}, cookies or {}], sort_keys=True).encode()
+        digest = hashlib.sha256()
+        for part in (method.encode("utf-8"), url.encode("utf-8"), body or b"", extra):
+            digest.update(part)
+            digest.update(b"\0")
+        return os.path.join(self.path, digest.hexdigest())
+
+    def save(self, method, url, body, headers, cookies, content, elapsed):
+        key = self._key(method, url, body, headers, cookies)
+        os.makedirs(self.path, exist_ok=True)
+        if content is not None:
+            with open(key + ".body", "wb") as f:
+                f.write(content)
+        with open(key + ".json", "w") as f:
+            json.dump(
+                {
+                    "method": method,
+                    "url": url,
+                    "found": content is not None,
+                    "elapsed": elapsed,
+                },
+                f,
+            )
+
+    def load(self, method, url, body, headers, cookies):
+        """Return (recorded, content, elapsed). content is None if the fetch failed"""
+        key = self._key(method, url, body, headers, cookies)
+        try:
+            with open(key + ".json") as f:
+                meta = json.load(f)
+        except FileNotFoundError:
+            return False, None, 0
+
+        content = None
+        if meta["found"]:
+            with open(key + ".body", "rb") as f:
+                content = f.read()
+        return True, content, meta["elapsed"]
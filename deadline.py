@@ -0,0 +1,75 @@
+# Copyright (c) 2016 Clarence Ho (clarenceho at gmail dot com)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import contextvars
+import time
+from contextlib import contextmanager
+
+# monotonic time by which the current request must be answered, None if unbounded
+_deadline = contextvars.ContextVar("deadline", default=None)
+
+
+class DeadlineExceeded(Exception):
+    """The time budget of the current request ran out"""
+
+
+@contextmanager
+def deadline_after(seconds):
+    """Bound the work done in this block (and in threads started with bind_context)
+    to seconds from now, or to the enclosing deadline if that is sooner"""
+    deadline = time.monotonic() + seconds
+    current = _deadline.get()
+    if current is not None:
+        deadline = min(deadline, current)
+    token = _deadline.set(deadline)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def get_remaining():
+    """Seconds left before the deadline, None if there is none"""
+    deadline = _deadline.get()
+    if deadline is None:
+        return None
+    return max(0, deadline - time.monotonic())
+
+
+def is_expired():
+    remaining = get_remaining()
+    return remaining is not None and remaining <= 0
+
+
+def limit_timeout(timeout):
+    """timeout shortened to the time left. Raises DeadlineExceeded if there is none"""
+    remaining = get_remaining()
+    if remaining is None:
+        return timeout
+    if remaining <= 0:
+        raise DeadlineExceeded()
+    return remaining if timeout is None else min(timeout, remaining)
+
+
+def bind_context(fn):
+    """Wrap fn to run in a copy of the current context, so that the deadline follows
+    it into executor threads"""
+    context = contextvars.copy_context()
+    return lambda *args: context.copy().run(fn, *args)
@@ -0,0 +1,116 @@
+# Copyright (c) 2016 Clarence Ho (clarenceho at gmail dot com)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import gzip
+import hashlib
+import threading
+
+import brotli
+
+GZIP_LEVEL = 6
+# bodies are compressed once per result, so this can be higher than on the fly
+BROTLI_QUALITY = 9
+# content codings a body is kept in, in order of preference
+ENCODINGS = ["br", "gzip", "identity"]
+
+
+class EncodedBody:
+    """A response body serialized once, kept with its gzip and brotli variants"""
+
+    def __init__(self, data):
+        self.digest = hashlib.blake2b(data, digest_size=16).hexdigest()
+        self._variants = {
+            "br": brotli.compress(data, quality=BROTLI_QUALITY),
+            "gzip": gzip.compress(data, compresslevel=GZIP_LEVEL),
+            "identity": data,
+        }
+
+    def get_body(self, encoding):
+        return self._variants[encoding]
+
+    def get_etag(self, encoding):
+        """Strong ETag of a variant. Each coding is a representation of its own"""
+        if encoding == "identity":
+            return self.digest
+        return f"{self.digest}-{encoding}"
+
+    def get_sizes(self):
+        return {encoding: len(body) for encoding, body in self._variants.items()}
+
+
+class EncodedBodies:
+    """The EncodedBody of each form of the latest value of each key.
+
+    Bodies are made by put, as values are cached, and looked up by value identity,
+    which is what a cache hands out until the entry is replaced.
+    """
+
+    def __init__(self, serializers):
+        # form name -> function serializing a value to the bytes of that form
+        self._serializers = serializers
+        self._lock = threading.Lock()
+        self._bodies = {}
+        self._hits = 0
+        self._misses = 0
+        self._encodes = 0
+
+    def put(self, key, value):
+        """Encode every form of value, replacing the bodies of key"""
+        bodies = {
+            form: EncodedBody(serialize(value))
+            for form, serialize in self._serializers.items()
+        }
+        with self._lock:
+            self._bodies[key] = (value, bodies)
+            self._encodes += 1
+
+    def drop(self, key, value):
+        """Forget the bodies of key if they are those of value"""
+        with self._lock:
+            latest = self._bodies.get(key)
+            if latest is not None and latest[0] is value:
+                del self._bodies[key]
+
+    def get(self, key, value, form):
+        """The EncodedBody of form for value, or None if value wasn't put"""
+        with self._lock:
+            latest = self._bodies.get(key)
+            if latest is None or latest[0] is not value:
+                self._misses += 1
+                return None
+            self._hits += 1
+            return latest[1][form]
+
+    def get_stats(self):
+        """Bodies served (hits), values served without one (misses) and values
+        encoded, and the bytes held in each coding"""
+        with self._lock:
+            sizes = dict.fromkeys(ENCODINGS, 0)
+            for _, bodies in self._bodies.values():
+                for body in bodies.values():
+                    for encoding, size in body.get_sizes().items():
+                        sizes[encoding] += size
+            return {
+                "bodies": len(self._bodies),
+                "hits": self._hits,
+                "misses": self._misses,
+                "encodes": self._encodes,
+                "bytes": sizes,
+            }
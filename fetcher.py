@@ -18,17 +18,588 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
+import asyncio
+import itertools
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from concurrent.futures import TimeoutError as FutureTimeoutError
 from urllib.parse import urlparse
-from curl_cffi import requests
+from curl_cffi import CurlHttpVersion, CurlInfo, requests
+from curl_cffi.curl import CURL_WRITEFUNC_ERROR
+from cache import ArticleCache, SingleFlight
+from cassette import CassetteStore
+from deadline import (
+    DeadlineExceeded,
+    bind_context,
+    get_remaining,
+    is_expired,
+    limit_timeout,
+)
 from logger import logger
 
 URL_TIMEOUT = 15
+# responses larger than this are aborted, unless the caller asks for another limit
+MAX_BODY_SIZE = 8 * 1024 * 1024
+# how much of the body of an error response is read (for logging)
+ERROR_BODY_PREVIEW = 500
+# timeouts of a host adapt to its latency: p99 x multiplier within floor / ceiling
+TIMEOUT_MULTIPLIER = 3
+TIMEOUT_FLOOR = 3
+TIMEOUT_CEILING = URL_TIMEOUT
+LATENCY_WINDOW = 200
+LATENCY_MIN_SAMPLES = 10
+# hedged requests: each request to a host earns HEDGE_BUDGET_RATIO of a hedge
+HEDGE_BUDGET_RATIO = 0.1
+HEDGE_BUDGET_BURST = 3
+HEDGE_WORKERS = 32
+# politeness limits of each host: requests per second (with bursts of up to
+# HOST_BURST) and requests in flight at once. HOST_LIMITS overrides them per host
+HOST_RATE_LIMIT = 10
+HOST_BURST = 10
+HOST_MAX_IN_FLIGHT = 6
+HOST_LIMITS = {
+    # paged sections, up to 10 pages each
+    "www.singpao.com.hk": {"rate": 2},
+}
+# "record" saves every fetched page to CASSETTE_DIR, "replay" serves them from there
+# instead of the network (e.g. to load test the app against a frozen snapshot)
+FETCH_MODE = os.environ.get("NEWSSUM_FETCH_MODE", "live")
+CASSETTE_DIR = os.environ.get("NEWSSUM_CASSETTE_DIR", "test/cassettes")
+# seconds to delay each replayed page, or "recorded" to take as long as the original
+REPLAY_LATENCY = os.environ.get("NEWSSUM_REPLAY_LATENCY", "0")
+VALIDATOR_CACHE_BYTES = 32 * 1024 * 1024
+# max number of requests in flight at once on an event loop
+ASYNC_MAX_CONCURRENCY = 20
+# consecutive failures before a host is skipped, and for how long (seconds)
+BREAKER_FAILURE_THRESHOLD = 5
+BREAKER_COOL_DOWN = 120
+# seconds after which a probe that never reported back is given up on
+BREAKER_PROBE_LEASE = 2 * URL_TIMEOUT
 
 
-def read_http_page(url, cookies=None, headers=None, method="GET", body=None):
-    """Fetch a http page using curl_cffi to impersonate a browser"""
+class CircuitBreaker:
+    """Per host circuit breaker.
+
+    After `threshold` consecutive failures the host is "open" and requests to it
+    fail fast. Once `cool_down` seconds have passed a single probe request is let
+    through ("half_open"). Its success closes the circuit, its failure re-opens it.
+    A probe that ends without either (see release) or outlives `probe_lease`
+    makes way for another one.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(
+        self,
+        threshold=BREAKER_FAILURE_THRESHOLD,
+        cool_down=BREAKER_COOL_DOWN,
+        probe_lease=BREAKER_PROBE_LEASE,
+    ):
+        self.threshold = threshold
+        self.cool_down = cool_down
+        self.probe_lease = probe_lease
+        self._lock = threading.Lock()
+        self._hosts = {}
+        self._probes = itertools.count(1)
+
+    def allow(self, host):
+        """Whether a request to host should be sent"""
+        return self.admit(host)[0]
+
+    def admit(self, host):
+        """Return (whether a request to host should be sent, probe). probe is None
+        unless the request is the half-open probe, and is handed to release"""
+        with self._lock:
+            circuit = self._hosts.get(host)
+            if circuit is None or circuit["state"] == self.CLOSED:
+                return True, None
+            now = time.monotonic()
+            if circuit["state"] == self.OPEN:
+                if now - circuit["opened_at"] < self.cool_down:
+                    circuit["rejected"] += 1
+                    return False, None
+                circuit["state"] = self.HALF_OPEN
+            elif now - circuit["probe_started"] < self.probe_lease:
+                # half open. Only one probe at a time
+                circuit["rejected"] += 1
+                return False, None
+            circuit["probe"] = next(self._probes)
+            circuit["probe_started"] = now
+            return True, circuit["probe"]
+
+    def release(self, host, probe):
+        """End a probe that got no verdict (e.g. cut by a deadline), so that the next
+        request probes again. A no-op once it was recorded as a success or failure"""
+        if probe is None:
+            return
+        with self._lock:
+            circuit = self._hosts.get(host)
+            if (
+                circuit is not None
+                and circuit["state"] == self.HALF_OPEN
+                and circuit["probe"] == probe
+            ):
+                # opened_at is kept, so the cool down is already over
+                circuit["state"] = self.OPEN
+                circuit["probe"] = None
+
+    def record_success(self, host):
+        with self._lock:
+            circuit = self._hosts.get(host)
+            if circuit is not None:
+                circuit["state"] = self.CLOSED
+                # kept in case the caller finds the response unusable after all
+                circuit["failures_before_success"] = circuit["failures"]
+                circuit["failures"] = 0
+
+    def record_failure(self, host):
+        with self._lock:
+            self._add_failure(self._get_circuit(host))
+
+    def record_unusable(self, host):
+        """Turn the last success of host back into a failure"""
+        with self._lock:
+            circuit = self._get_circuit(host)
+            circuit["failures"] = max(
+                circuit["failures"], circuit["failures_before_success"]
+            )
+            self._add_failure(circuit)
+            circuit["failures_before_success"] = circuit["failures"]
+
+    def _get_circuit(self, host):
+        circuit = self._hosts.get(host)
+        if circuit is None:
+            circuit = {
+                "host": host,
+                "state": self.CLOSED,
+                "failures": 0,
+                "failures_before_success": 0,
+                "opened_at": 0,
+                "probe": None,
+                "probe_started": 0,
+                "rejected": 0,
+            }
+            self._hosts[host] = circuit
+        return circuit
+
+    def _add_failure(self, circuit):
+        circuit["failures"] += 1
+        if circuit["state"] == self.HALF_OPEN or circuit["failures"] >= self.threshold:
+            if circuit["state"] != self.OPEN:
+                logger.info(f"Circuit opened for {circuit['host']}")
+            circuit["state"] = self.OPEN
+            circuit["opened_at"] = time.monotonic()
+
+    def get_state(self, host):
+        with self._lock:
+            circuit = self._hosts.get(host)
+            return circuit["state"] if circuit else self.CLOSED
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                host: {
+                    "state": circuit["state"],
+                    "failures": circuit["failures"],
+                    "rejected": circuit["rejected"],
+                }
+                for host, circuit in self._hosts.items()
+                if circuit["failures"] or circuit["state"] != self.CLOSED
+            }
+
+
+_breaker = CircuitBreaker()
+_cassettes = CassetteStore(CASSETTE_DIR)
+
+
+class LatencyHistogram:
+    """Latencies of the most recent requests to a host"""
+
+    def __init__(self, size=LATENCY_WINDOW):
+        self._samples = deque(maxlen=size)
+
+    def add(self, seconds):
+        self._samples.append(seconds)
+
+    def __len__(self):
+        return len(self._samples)
+
+    def percentile(self, pct):
+        ordered = sorted(self._samples)
+        if not ordered:
+            return None
+        return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+    def get_timeout(self):
+        if len(self._samples) < LATENCY_MIN_SAMPLES:
+            return URL_TIMEOUT
+        return min(
+            TIMEOUT_CEILING,
+            max(TIMEOUT_FLOOR, self.percentile(99) * TIMEOUT_MULTIPLIER),
+        )
+
+
+_latencies = {}
+_latency_lock = threading.Lock()
+
+
+def _record_latency(host, seconds):
+    with _latency_lock:
+        histogram = _latencies.get(host)
+        if histogram is None:
+            histogram = _latencies[host] = LatencyHistogram()
+        histogram.add(seconds)
+
+
+def get_timeout(host):
+    """Timeout (seconds) for the next request to host, based on its past latency"""
+    with _latency_lock:
+        histogram = _latencies.get(host)
+        return histogram.get_timeout() if histogram else URL_TIMEOUT
+
+
+def get_latency_stats():
+    """Latency percentiles and current timeout of each host, slowest (p99) first"""
+    with _latency_lock:
+        stats = {
+            host: {
+                "count": len(histogram),
+                "p50": round(histogram.percentile(50), 3),
+                "p95": round(histogram.percentile(95), 3),
+                "p99": round(histogram.percentile(99), 3),
+                "timeout": round(histogram.get_timeout(), 3),
+            }
+            for host, histogram in _latencies.items()
+        }
+    return dict(sorted(stats.items(), key=lambda item: -item[1]["p99"]))
+
+
+def is_host_available(url):
+    """False if the circuit for the host of url is open and requests would fail fast"""
+    return _breaker.get_state(urlparse(url).netloc) != CircuitBreaker.OPEN
+
+
+def report_failure(url):
+    """Let callers count a response they could not use (e.g. no articles in it)"""
+    _breaker.record_unusable(urlparse(url).netloc)
+
+
+def get_circuit_stats():
+    """Hosts that have recently failed and the state of their circuit"""
+    return _breaker.get_stats()
+
+
+class HedgeBudget:
+    """Limit hedged requests to a fraction of the requests sent to each host"""
+
+    def __init__(self, ratio=HEDGE_BUDGET_RATIO, burst=HEDGE_BUDGET_BURST):
+        self.ratio = ratio
+        self.burst = burst
+        self._lock = threading.Lock()
+        self._tokens = {}
+        self._stats = {}
+
+    def add_request(self, host):
+        with self._lock:
+            self._tokens[host] = min(
+                self.burst, self._tokens.get(host, self.burst) + self.ratio
+            )
+
+    def try_spend(self, host):
+        with self._lock:
+            stats = self._stats.setdefault(
+                host, {"hedged": 0, "won": 0, "over_budget": 0}
+            )
+            if self._tokens.get(host, 0) < 1:
+                stats["over_budget"] += 1
+                return False
+            self._tokens[host] -= 1
+            stats["hedged"] += 1
+            return True
+
+    def record_win(self, host):
+        with self._lock:
+            self._stats[host]["won"] += 1
+
+    def get_stats(self):
+        with self._lock:
+            return {host: dict(stats) for host, stats in self._stats.items()}
+
+
+_hedge_budget = HedgeBudget()
+_hedge_executor = ThreadPoolExecutor(
+    max_workers=HEDGE_WORKERS, thread_name_prefix="hedge"
+)
+
+
+def get_hedge_delay(host):
+    """p95 latency of host, or None if there isn't enough data to hedge on"""
+    with _latency_lock:
+        histogram = _latencies.get(host)
+        if histogram is None or len(histogram) < LATENCY_MIN_SAMPLES:
+            return None
+        return histogram.percentile(95)
+
+
+def get_hedge_stats():
+    """Per host number of hedged requests, and how often the hedge was faster"""
+    return _hedge_budget.get_stats()
+
+
+def _send_hedged(host, send, delay):
+    primary = _hedge_executor.submit(send)
+    try:
+        return primary.result(timeout=delay)
+    except FutureTimeoutError:
+        pass
+
+    if not _hedge_budget.try_spend(host):
+        return primary.result()
+
+    # a transfer in flight can't be interrupted. The slower one finishes in the
+    # background and its response is dropped
+    backup = _hedge_executor.submit(send)
+    pending = {primary, backup}
+    result = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            result = future.result()
+            if result is not None:
+                if future is backup:
+                    _hedge_budget.record_win(host)
+                return result
+    return result
+
+
+class HostLimiter:
+    """Per host token bucket (requests per second) and cap on requests in flight.
+
+    Time spent waiting for either is counted per host, to show when the limits
+    rather than the upstreams are what makes fetching slow.
+    """
+
+    def __init__(
+        self,
+        rate=HOST_RATE_LIMIT,
+        burst=HOST_BURST,
+        max_in_flight=HOST_MAX_IN_FLIGHT,
+        overrides=None,
+    ):
+        self.rate = rate
+        self.burst = burst
+        self.max_in_flight = max_in_flight
+        self._overrides = {
+            host: dict(limits) for host, limits in (overrides or {}).items()
+        }
+        self._lock = threading.Lock()
+        self._slot_freed = threading.Condition(self._lock)
+        self._buckets = {}
+        self._in_flight = {}
+        self._stats = {}
+
+    def set_limits(self, host, rate=None, burst=None, max_in_flight=None):
+        """Override the limits of one host. None keeps the current value"""
+        with self._lock:
+            limits = self._overrides.setdefault(host, {})
+            for name, value in (
+                ("rate", rate),
+                ("burst", burst),
+                ("max_in_flight", max_in_flight),
+            ):
+                if value is not None:
+                    limits[name] = value
+
+    def get_max_in_flight(self, host):
+        with self._lock:
+            return self._get_limit(host, "max_in_flight")
+
+    def reserve(self, host):
+        """Take a token from the bucket of host. Returns how long to wait before
+        sending (seconds); the token is already spent by then"""
+        with self._lock:
+            rate = self._get_limit(host, "rate")
+            burst = self._get_limit(host, "burst")
+            now = time.monotonic()
+            tokens, last = self._buckets.get(host, (burst, now))
+            tokens = min(burst, tokens + (now - last) * rate) - 1
+            self._buckets[host] = (tokens, now)
+            return -tokens / rate if tokens < 0 else 0
+
+    def acquire(self, host, timeout=None):
+        """Block until host has a free slot. Returns how long it waited (seconds).
+
+        Raises DeadlineExceeded if no slot was freed within timeout.
+        """
+        start = time.monotonic()
+        with self._slot_freed:
+            if not self._slot_freed.wait_for(
+                lambda: self._in_flight.get(host, 0)
+                < self._get_limit(host, "max_in_flight"),
+                timeout,
+            ):
+                raise DeadlineExceeded()
+            self._in_flight[host] = self._in_flight.get(host, 0) + 1
+        return time.monotonic() - start
+
+    def release(self, host):
+        with self._slot_freed:
+            self._in_flight[host] -= 1
+            self._slot_freed.notify_all()
+
+    def record_wait(self, host, slot_wait, rate_wait):
+        with self._lock:
+            stats = self._stats.setdefault(
+                host,
+                {"requests": 0, "throttled": 0, "slot_wait": 0, "rate_wait": 0},
+            )
+            stats["requests"] += 1
+            if slot_wait + rate_wait > 0.001:
+                stats["throttled"] += 1
+            stats["slot_wait"] += slot_wait
+            stats["rate_wait"] += rate_wait
+
+    def get_stats(self):
+        with self._lock:
+            stats = {
+                host: {
+                    "requests": stats["requests"],
+                    "throttled": stats["throttled"],
+                    "slot_wait": round(stats["slot_wait"], 3),
+                    "rate_wait": round(stats["rate_wait"], 3),
+                    "in_flight": self._in_flight.get(host, 0),
+                }
+                for host, stats in self._stats.items()
+            }
+        return dict(
+            sorted(
+                stats.items(),
+                key=lambda item: -(item[1]["slot_wait"] + item[1]["rate_wait"]),
+            )
+        )
+
+    def _get_limit(self, host, name):
+        return self._overrides.get(host, {}).get(name, getattr(self, name))
+
+
+_host_limiter = HostLimiter(overrides=HOST_LIMITS)
+
+
+def set_host_limits(host, rate=None, burst=None, max_in_flight=None):
+    """Change the requests per second / in flight allowed to host"""
+    _host_limiter.set_limits(host, rate, burst, max_in_flight)
+
+
+def get_throttle_stats():
+    """Per host time spent (seconds) waiting on the politeness limits, most first"""
+    return _host_limiter.get_stats()
+
+
+@contextmanager
+def _host_turn(host):
+    """Wait for a free slot and a token of host, and hold the slot meanwhile.
+
+    Raises DeadlineExceeded if the request runs out of time before its turn.
+    """
+    slot_wait = _host_limiter.acquire(host, get_remaining())
+    try:
+        rate_wait = _host_limiter.reserve(host)
+        if rate_wait:
+            remaining = get_remaining()
+            if remaining is not None and rate_wait >= remaining:
+                raise DeadlineExceeded()
+            time.sleep(rate_wait)
+        _host_limiter.record_wait(host, slot_wait, rate_wait)
+        yield
+    finally:
+        _host_limiter.release(host)
+
+
+# one session per host so that connections (and HTTP/2 streams) are reused across
+# calls. curl_cffi keeps a separate curl handle per thread within a session
+_sessions = {}
+_connection_stats = {}
+_sessions_lock = threading.Lock()
+
+
+def _get_session(host):
+    with _sessions_lock:
+        session = _sessions.get(host)
+        if session is None:
+            session = requests.Session(
+                impersonate="chrome",
+                http_version=CurlHttpVersion.V2TLS,
+                curl_infos=[CurlInfo.NUM_CONNECTS],
+                # cookies are passed per call. Don't let them leak between calls
+                discard_cookies=True,
+            )
+            _sessions[host] = session
+    return session
+
+
+def _record_connection(host, resp):
+    with _sessions_lock:
+        stats = _connection_stats.setdefault(host, {"requests": 0, "reused": 0})
+        stats["requests"] += 1
+        if resp.infos.get(CurlInfo.NUM_CONNECTS) == 0:
+            stats["reused"] += 1
+
+
+# ETag / Last-Modified of GET responses, with the body to hand back on a 304
+_validators = ArticleCache(max_bytes=VALIDATOR_CACHE_BYTES)
+_validator_stats = {"conditional": 0, "not_modified": 0}
+_validator_lock = threading.Lock()
+
+
+def _add_validators(url, headers):
+    validator, _ = _validators.peek(url)
+    if validator is None:
+        return None
+    if validator["etag"]:
+        headers["If-None-Match"] = validator["etag"]
+    if validator["last_modified"]:
+        headers["If-Modified-Since"] = validator["last_modified"]
+    with _validator_lock:
+        _validator_stats["conditional"] += 1
+    return validator
+
+
+def _store_validators(url, resp, content):
+    etag = resp.headers.get("etag")
+    last_modified = resp.headers.get("last-modified")
+    if etag or last_modified:
+        _validators.put(
+            url,
+            {"etag": etag, "last_modified": last_modified, "body": content},
+            float("inf"),
+        )
+    else:
+        _validators.invalidate(url)
+
+
+def get_validator_stats():
+    """Number of conditional requests sent and how many were answered with 304"""
+    with _validator_lock:
+        return dict(_validator_stats, stored=_validators.get_stats()["entries"])
+
+
+def get_connection_stats():
+    """Per host number of requests and how many of them reused a connection"""
+    with _sessions_lock:
+        return {host: dict(stats) for host, stats in _connection_stats.items()}
+
+
+def _prepare_request(url, headers, method):
+    """Return the host, request headers and stored validator for a request"""
     parsed_url = urlparse(url)
-    referer = f"{parsed_url.scheme}://{parsed_url.netloc}/"
+    host = parsed_url.netloc
+    referer = f"{parsed_url.scheme}://{host}/"
 
     the_headers = {
         "referer": referer,
@@ -37,22 +608,407 @@ def read_http_page(url, cookies=None, headers=None, method="GET", body=None):
     if headers:
         the_headers.update(headers)
 
+    validator = None
+    if method == "GET":
+        validator = _add_validators(url, the_headers)
+
+    return host, the_headers, validator
+
+
+class _BodyReader:
+    """Collect a response body chunk by chunk, giving up early when it isn't wanted.
+
+    With the curl handle of the transfer, the status and announced length are
+    checked as soon as the body starts arriving. Error responses are only read
+    for ERROR_BODY_PREVIEW bytes, and bodies over max_size are not read at all.
+    """
+
+    def __init__(self, max_size, curl=None):
+        self.max_size = max_size
+        self.status = None
+        self.aborted = None
+        self._curl = curl
+        self._chunks = []
+        self._size = 0
+        self._limit = max_size
+
+    def __call__(self, chunk):
+        if self._curl is not None and self.status is None:
+            self.status = self._curl.getinfo(CurlInfo.RESPONSE_CODE)
+            length = self._curl.getinfo(CurlInfo.CONTENT_LENGTH_DOWNLOAD_T)
+            if self.status >= 400:
+                self._limit = ERROR_BODY_PREVIEW
+            elif length > self.max_size:
+                self.aborted = f"Content-Length {length} exceeds {self.max_size}"
+                return CURL_WRITEFUNC_ERROR
+
+        if self._size + len(chunk) > self._limit:
+            self._chunks.append(chunk[: self._limit - self._size])
+            self._size = self._limit
+            if self._limit == self.max_size:
+                self.aborted = f"body exceeds {self.max_size}"
+            else:
+                self.aborted = f"HTTP {self.status}"
+            return CURL_WRITEFUNC_ERROR
+
+        self._chunks.append(chunk)
+        self._size += len(chunk)
+        return len(chunk)
+
+    def get_content(self):
+        # joining a single chunk returns it as is
+        return b"".join(self._chunks)
+
+
+def _handle_aborted(url, host, reader):
+    """Log a response that _BodyReader cut short"""
+    if reader.status is not None and reader.status >= 400:
+        _breaker.record_failure(host)
+        logger.exception(
+            f"HTTP {reader.status} when fetching {url}. Content: {reader.get_content()}"
+        )
+    else:
+        logger.exception(f"Aborted reading {url}: {reader.aborted}")
+
+
+def _handle_response(url, method, host, resp, content, validator):
+    """Return the body of a response, the stored body if it was a 304, or None
+    on errors"""
+    _record_connection(host, resp)
+    if resp.status_code >= 400:
+        _breaker.record_failure(host)
+    else:
+        _breaker.record_success(host)
+    if resp.status_code == 304 and validator is not None:
+        # unchanged since last time. Hand back the same bytes so that callers
+        # can recognize and skip re-parsing it
+        with _validator_lock:
+            _validator_stats["not_modified"] += 1
+        return validator["body"]
+    if method == "GET" and resp.status_code == 200:
+        _store_validators(url, resp, content)
+    if resp.status_code != 200:
+        logger.exception(
+            f"HTTP {resp.status_code} when fetching {url}. Content: {content[:ERROR_BODY_PREVIEW]}"
+        )
+    if resp.status_code >= 400:
+        return None
+    return content
+
+
+# identical requests made at the same time (e.g. by two sources sharing a feed) are
+# sent once and all callers get the same bytes
+_fetch_flight = SingleFlight()
+_async_flight_stats = {"calls": 0, "shared": 0}
+
+
+def _freeze(value):
+    if isinstance(value, dict):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+    if isinstance(value, list):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+def _flight_key(method, url, body, headers, cookies):
+    # headers and cookies can change the response (a session, a language, a
+    # preference kept in a cookie), so requests only share a flight if those
+    # match as well
+    return method, url, _freeze(body), _freeze(headers), _freeze(cookies)
+
+
+def get_flight_stats():
+    """Number of fetches, and how many shared the response of an identical one"""
+    stats = _fetch_flight.get_stats()
+    with _sessions_lock:
+        for name, value in _async_flight_stats.items():
+            stats[name] += value
+    return stats
+
+
+def _replay(method, url, body, headers, cookies):
+    """Return the recorded content of a request and how long to delay it"""
+    recorded, content, elapsed = _cassettes.load(method, url, body, headers, cookies)
+    if not recorded:
+        logger.info(f"No recording of {method} {url}")
+    delay = elapsed if REPLAY_LATENCY == "recorded" else float(REPLAY_LATENCY)
+    return content, delay
+
+
+def read_http_page(
+    url,
+    cookies=None,
+    headers=None,
+    method="GET",
+    body=None,
+    timeout=None,
+    hedge=False,
+    max_size=MAX_BODY_SIZE,
+):
+    """Fetch a http page using curl_cffi to impersonate a browser.
+
+    Returns the body, or None if the request failed, the server responded with an
+    error or the body is larger than max_size. Without an explicit timeout, the
+    adaptive timeout of the host is used. With hedge, a GET that takes longer than
+    the host's p95 latency is sent a second time and whichever response arrives
+    first is used. Under a request deadline, the timeout is cut to the time left.
+    """
+    if FETCH_MODE == "replay":
+        content, delay = _replay(method, url, body, headers, cookies)
+        remaining = get_remaining()
+        if remaining is not None and delay > remaining:
+            time.sleep(remaining)
+            logger.info(f"Request deadline reached reading {url}")
+            return None
+        time.sleep(delay)
+        return content
+
+    def _fetch_and_record():
+        start = time.monotonic()
+        content = _fetch(url, cookies, headers, method, body, timeout, hedge, max_size)
+        if FETCH_MODE == "record":
+            _cassettes.save(
+                method, url, body, headers, cookies, content, time.monotonic() - start
+            )
+        return content
+
+    key = _flight_key(method, url, body, headers, cookies)
     try:
-        resp = requests.request(
-            method,
-            url,
-            headers=the_headers,
-            cookies=cookies,
-            data=body,
+        return _fetch_flight.do(key, _fetch_and_record, timeout=get_remaining())
+    except TimeoutError:
+        # the identical fetch we joined has no deadline, or a later one
+        logger.info(f"Request deadline reached waiting for {url}")
+        return None
+
+
+def _fetch(url, cookies, headers, method, body, timeout, hedge, max_size):
+    host, the_headers, validator = _prepare_request(url, headers, method)
+    allowed, probe = _breaker.admit(host)
+    if not allowed:
+        logger.info(f"Circuit open for {host}. Skipping {url}")
+        return None
+    timeout = timeout or get_timeout(host)
+
+    def _send():
+        session = _get_session(host)
+        # the session hands out a curl handle per thread. This is the one that
+        # will perform the request
+        reader = _BodyReader(max_size, session.curl)
+        start = None
+        try:
+            with _host_turn(host):
+                start = time.monotonic()
+                resp = session.request(
+                    method,
+                    url,
+                    headers=the_headers,
+                    cookies=cookies,
+                    data=body,
+                    timeout=limit_timeout(timeout),
+                    content_callback=reader,
+                )
+            _record_latency(host, time.monotonic() - start)
+            return _handle_response(
+                url, method, host, resp, reader.get_content(), validator
+            )
+        except DeadlineExceeded:
+            logger.info(f"Request deadline reached. Skipping {url}")
+        except Exception as e:
+            if is_expired():
+                # cut short by the request deadline, which says nothing of the host
+                logger.info(f"Request deadline reached reading {url}")
+                return None
+            # timeouts count too, so that a host that got slower gets more headroom
+            if start is not None:
+                _record_latency(host, time.monotonic() - start)
+            if reader.aborted:
+                _handle_aborted(url, host, reader)
+                return None
+            _breaker.record_failure(host)
+            logger.exception("Problem reading http page: " + str(e))
+
+        return None
+
+    try:
+        if hedge and method == "GET":
+            _hedge_budget.add_request(host)
+            delay = get_hedge_delay(host)
+            if delay is not None:
+                # the copies run on the hedge executor, under the deadline of the
+                # caller
+                return _send_hedged(host, bind_context(_send), delay)
+
+        return _send()
+    finally:
+        # a probe cut by the deadline or aborted for its size says nothing of the
+        # host, and must not keep the circuit half open
+        _breaker.release(host, probe)
+
+
+class _AsyncState:
+    def __init__(self, loop):
+        self.loop = loop
+        self.session = requests.AsyncSession(
+            max_clients=ASYNC_MAX_CONCURRENCY,
             impersonate="chrome",
-            timeout=URL_TIMEOUT,
+            http_version=CurlHttpVersion.V2TLS,
+            curl_infos=[CurlInfo.NUM_CONNECTS],
+            discard_cookies=True,
         )
-        if resp.status_code != 200:
-            logger.exception(
-                f"HTTP {resp.status_code} when fetching {url}. Content: {resp.content[:500]}"
+        self.semaphore = asyncio.Semaphore(ASYNC_MAX_CONCURRENCY)
+        self.host_semaphores = {}
+        self.flights = {}
+
+    def get_host_semaphore(self, host):
+        semaphore = self.host_semaphores.get(host)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(_host_limiter.get_max_in_flight(host))
+            self.host_semaphores[host] = semaphore
+        return semaphore
+
+
+# session and concurrency limit of each event loop. asyncio objects can't be
+# shared between loops
+_async_states = {}
+
+
+def _get_async_state():
+    loop = asyncio.get_running_loop()
+    with _sessions_lock:
+        state = _async_states.get(loop)
+        if state is None:
+            for closed in [lp for lp in _async_states if lp.is_closed()]:
+                del _async_states[closed]
+            state = _AsyncState(loop)
+            _async_states[loop] = state
+    return state
+
+
+async def async_read_http_page(
+    url,
+    cookies=None,
+    headers=None,
+    method="GET",
+    body=None,
+    timeout=None,
+    max_size=MAX_BODY_SIZE,
+):
+    """Asyncio version of read_http_page. Returns the page content or None"""
+    if FETCH_MODE == "replay":
+        content, delay = _replay(method, url, body, headers, cookies)
+        remaining = get_remaining()
+        if remaining is not None and delay > remaining:
+            await asyncio.sleep(remaining)
+            logger.info(f"Request deadline reached reading {url}")
+            return None
+        await asyncio.sleep(delay)
+        return content
+
+    async def _fetch_and_record():
+        start = time.monotonic()
+        content = await _async_fetch(
+            url, cookies, headers, method, body, timeout, max_size
+        )
+        if FETCH_MODE == "record":
+            _cassettes.save(
+                method, url, body, headers, cookies, content, time.monotonic() - start
             )
-        return resp.content
+        return content
+
+    state = _get_async_state()
+    key = _flight_key(method, url, body, headers, cookies)
+    task = state.flights.get(key)
+    with _sessions_lock:
+        _async_flight_stats["calls"] += 1
+        if task is not None:
+            _async_flight_stats["shared"] += 1
+    if task is None:
+        task = asyncio.ensure_future(_fetch_and_record())
+        state.flights[key] = task
+        task.add_done_callback(lambda _: state.flights.pop(key, None))
+    # one caller being cancelled must not cancel the fetch the others wait on
+    try:
+        return await asyncio.wait_for(asyncio.shield(task), get_remaining())
+    except asyncio.TimeoutError:
+        logger.info(f"Request deadline reached waiting for {url}")
+        return None
+
+
+async def _async_fetch(url, cookies, headers, method, body, timeout, max_size):
+    host, the_headers, validator = _prepare_request(url, headers, method)
+    allowed, probe = _breaker.admit(host)
+    if not allowed:
+        logger.info(f"Circuit open for {host}. Skipping {url}")
+        return None
+    try:
+        return await _async_send(
+            url, host, the_headers, validator, cookies, method, body, timeout, max_size
+        )
+    finally:
+        # like _fetch, a probe without a verdict makes way for the next one
+        _breaker.release(host, probe)
+
+
+async def _async_send(
+    url, host, the_headers, validator, cookies, method, body, timeout, max_size
+):
+    timeout = timeout or get_timeout(host)
+    state = _get_async_state()
+    # the curl handle is picked inside the session, so only the size is checked
+    reader = _BodyReader(max_size)
+
+    start = None
+    try:
+        # requests per second are shared with the threads. Slots in flight are
+        # counted per event loop, like ASYNC_MAX_CONCURRENCY
+        wait_start = time.monotonic()
+        async with state.get_host_semaphore(host):
+            slot_wait = time.monotonic() - wait_start
+            rate_wait = _host_limiter.reserve(host)
+            if rate_wait:
+                remaining = get_remaining()
+                if remaining is not None and rate_wait >= remaining:
+                    raise DeadlineExceeded()
+                await asyncio.sleep(rate_wait)
+            _host_limiter.record_wait(host, slot_wait, rate_wait)
+            async with state.semaphore:
+                send_timeout = limit_timeout(timeout)
+                start = time.monotonic()
+                resp = await asyncio.wait_for(
+                    state.session.request(
+                        method,
+                        url,
+                        headers=the_headers,
+                        cookies=cookies,
+                        data=body,
+                        timeout=send_timeout,
+                        content_callback=reader,
+                    ),
+                    send_timeout,
+                )
+        _record_latency(host, time.monotonic() - start)
+        return _handle_response(
+            url, method, host, resp, reader.get_content(), validator
+        )
+    except DeadlineExceeded:
+        logger.info(f"Request deadline reached. Skipping {url}")
+    except asyncio.TimeoutError:
+        if is_expired():
+            logger.info(f"Request deadline reached reading {url}")
+            return None
+        _record_latency(host, time.monotonic() - start)
+        _breaker.record_failure(host)
+        logger.exception(f"Timeout after {timeout}s reading http page: {url}")
     except Exception as e:
+        if is_expired():
+            logger.info(f"Request deadline reached reading {url}")
+            return None
+        if start is not None:
+            _record_latency(host, time.monotonic() - start)
+        if reader.aborted:
+            _handle_aborted(url, host, reader)
+            return None
+        _breaker.record_failure(host)
         logger.exception("Problem reading http page: " + str(e))
 
     return None
@@ -20,19 +20,71 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
+import itertools
 import os
 
-from flask import Flask, jsonify, request, send_from_directory
+from flask import (
+    Flask,
+    Response,
+    jsonify,
+    request,
+    send_from_directory,
+    stream_with_context,
+)
 from flask_cors import CORS
 
+from bulkhead import Bulkhead, BulkheadFull
+from cache import ArticleCache
+from deadline import deadline_after, get_remaining, is_expired
+from encoded import ENCODINGS, EncodedBodies
+from fetcher import (
+    get_circuit_stats,
+    get_connection_stats,
+    get_flight_stats,
+    get_hedge_stats,
+    get_latency_stats,
+    get_throttle_stats,
+    get_validator_stats,
+)
+from refresher import Refresher, has_articles
+from sources.base import (
+    get_parse_cache_stats,
+    get_section_cache_stats,
+    is_complete,
+    mark_pending,
+)
 from util import get_sources
 
-allSources = get_sources()
+NDJSON_MIMETYPE = "application/x-ndjson"
+# seconds a request may spend scraping a source. Sections not read by then are
+# answered from the section cache or marked pending
+REQUEST_DEADLINE = 10
+# seconds a client waits before retrying a source whose bulkhead was full
+RETRY_AFTER = 30
 
 app = Flask(__name__, static_url_path="", static_folder="static")
 CORS(app)
 
 
+def _to_ndjson(articles):
+    return "".join(app.json.dumps(article) + "\n" for article in articles).encode()
+
+
+# cached source results as the bytes jsonify or the stream would send, made when
+# the result is cached rather than on each request
+encoded_bodies = EncodedBodies(
+    {
+        "json": lambda articles: app.json.response(articles).get_data(),
+        "ndjson": _to_ndjson,
+    }
+)
+
+allSources = get_sources()
+article_cache = ArticleCache(on_put=encoded_bodies.put, on_evict=encoded_bodies.drop)
+bulkhead = Bulkhead()
+refresher = Refresher(allSources, article_cache, bulkhead=bulkhead)
+
+
 # route for source listing
 @app.route("/list", methods=["GET"])
 def route_list():
@@ -52,25 +104,192 @@ def route_about():
     return jsonify(_get_app_properties())
 
 
+@app.route("/stats", methods=["GET"])
+def route_stats():
+    return jsonify(
+        {
+            "cache": article_cache.get_stats(),
+            "bodies": encoded_bodies.get_stats(),
+            "bulkheads": bulkhead.get_stats(),
+            "parses": get_parse_cache_stats(),
+            "sections": get_section_cache_stats(),
+            "refresher": refresher.get_stats(),
+            "connections": get_connection_stats(),
+            "flights": get_flight_stats(),
+            "validators": get_validator_stats(),
+            "circuits": get_circuit_stats(),
+            "latencies": get_latency_stats(),
+            "hedges": get_hedge_stats(),
+            "throttles": get_throttle_stats(),
+        }
+    )
+
+
 # route for sources
 def route_source():
     articles = []
 
     the_path = request.path.strip("/")
     if the_path in allSources:
-        articles.extend(allSources[the_path].get_articles())
+        # started lazily so that the reloader process of the dev server stays idle
+        refresher.start()
+        source = allSources[the_path]
+        if _wants_stream():
+            articles = article_cache.get_cached(the_path, on_stale=refresher.refresh)
+            if articles is not None:
+                return _send_encoded(the_path, articles, "ndjson")
+            stream = _stream_source(the_path, source)
+            try:
+                # the first line tells whether the bulkhead started the scrape in time
+                first = next(stream, "")
+            except (BulkheadFull, TimeoutError):
+                return _busy()
+            response = Response(
+                stream_with_context(itertools.chain([first], stream)),
+                mimetype=NDJSON_MIMETYPE,
+            )
+            # the headers go out before it's known whether sections are pending
+            response.cache_control.no_cache = True
+            return response
+        # serve the last result right away and let the refresher update stale ones.
+        # concurrent requests for an uncached source share a single scrape, and a
+        # result without articles or with pending sections isn't kept so that the
+        # next request retries
+        with deadline_after(REQUEST_DEADLINE):
+            try:
+                articles = article_cache.get(
+                    the_path,
+                    lambda: bulkhead.run(
+                        source.get_bulkhead(),
+                        lambda: _scrape(source),
+                        get_remaining(),
+                    ),
+                    source.get_cache_ttl(),
+                    on_stale=refresher.refresh,
+                    accept=_is_cacheable,
+                    timeout=get_remaining(),
+                )
+            except BulkheadFull:
+                return _busy()
+            except TimeoutError:
+                # a refresh of the source is still running. Don't wait past the
+                # deadline for it
+                articles, _ = article_cache.peek(the_path)
+                if articles is None:
+                    return _busy()
+        return _send_encoded(the_path, articles, "json")
 
     return jsonify(articles)
 
 
+def _is_cacheable(articles):
+    """Whether a result is kept: not empty (e.g. every circuit open) nor cut short"""
+    return has_articles(articles) and is_complete(articles)
+
+
+def _scrape(source):
+    """get_articles of source. If the deadline ran out meanwhile, its empty sections
+    may have been cut short and are marked pending so the result isn't cached"""
+    articles = source.get_articles()
+    if is_expired():
+        mark_pending(articles)
+    return articles
+
+
+def _iter_scrape(source):
+    """iter_articles of source, with sections cut by the deadline marked pending
+    like _scrape"""
+    articles = []
+    for article in source.iter_articles():
+        articles.append(article)
+        yield article
+    if is_expired():
+        mark_pending(articles)
+
+
+def _send_encoded(the_path, articles, form):
+    """Answer with the body encoded for this result in form ("json" or "ndjson"), or
+    304 if the client has it. A result that wasn't cached is sent as is"""
+    mimetype = NDJSON_MIMETYPE if form == "ndjson" else "application/json"
+    body = encoded_bodies.get(the_path, articles, form)
+    if body is None:
+        # not cached, e.g. for pending sections that the next request reads again
+        if form == "ndjson":
+            response = Response(_to_ndjson(articles), mimetype=mimetype)
+        else:
+            response = jsonify(articles)
+        response.cache_control.no_cache = True
+        return response
+    encoding = request.accept_encodings.best_match(ENCODINGS, default="identity")
+    # each coding is a representation of its own: only its ETag means the client
+    # has it
+    if request.if_none_match.contains_weak(body.get_etag(encoding)):
+        response = Response(status=304)
+    else:
+        response = Response(body.get_body(encoding), mimetype=mimetype)
+        if encoding != "identity":
+            response.content_encoding = encoding
+    response.set_etag(body.get_etag(encoding))
+    response.vary.add("Accept-Encoding")
+    if not is_complete(articles):
+        # pending sections are read again by the next request
+        response.cache_control.no_cache = True
+    return response
+
+
+def _busy():
+    """503 for a source with nothing cached that can't be scraped in time"""
+    response = jsonify([])
+    response.status_code = 503
+    response.retry_after = RETRY_AFTER
+    return response
+
+
+def _wants_stream():
+    """Whether the articles are asked for as newline delimited JSON"""
+    if request.args.get("stream") == "1":
+        return True
+    return (
+        request.accept_mimetypes.best_match(["application/json", NDJSON_MIMETYPE])
+        == NDJSON_MIMETYPE
+    )
+
+
+def _stream_source(the_path, source):
+    """Yield the sections and articles of a source one JSON document per line.
+
+    A cached result is sent as is (refreshed in the background if stale). Otherwise
+    each section is sent as soon as it is read, by a single scrape shared with the
+    concurrent requests of the source, and the whole result is cached at the end
+    unless sections were left pending.
+    """
+    with deadline_after(REQUEST_DEADLINE):
+        for article in article_cache.stream(
+            the_path,
+            lambda: _iter_scrape(source),
+            lambda fn: bulkhead.submit(source.get_bulkhead(), fn),
+            source.get_cache_ttl(),
+            on_stale=refresher.refresh,
+            accept=_is_cacheable,
+            timeout=get_remaining(),
+        ):
+            yield app.json.dumps(article) + "\n"
+
+
 # since we don't have memcache in GCP py3, tell browsers / proxy servers to cache everything to minimize our computation cost
 @app.after_request
 def add_header(response):
-    if request.path in ["/list", "/about"]:
+    if (
+        request.path in ["/list", "/about", "/stats"]
+        or response.status_code >= 500
+        or response.cache_control.no_cache
+    ):
         return response
 
     response.cache_control.public = True
     response.cache_control.max_age = 900
+    # sources answer with JSON or NDJSON depending on Accept
+    response.vary.add("Accept")
     return response
 
 
@@ -50,6 +50,54 @@ export default class NewsSumApi {
     return Promise.reject(new Error("Failed to load content"));
   }
 
+  // calls onArticles with each batch of sections / articles as they arrive
+  static async streamArticles(path: string, onArticles: (articles: NewsArticle[]) => void): Promise<void> {
+    try {
+      // TODO setup url for dev
+      const response = await fetch((import.meta.env.DEV? "https://news-sum.appspot.com/" + path : "/" + path) + "?stream=1", {
+        "method": "GET",
+        "headers": {
+          "Accept": "application/x-ndjson",
+        },
+      })
+      if (response.ok) {
+        const contentType = response.headers.get("Content-Type") || "";
+        if (!response.body || !contentType.startsWith("application/x-ndjson")) {
+          // servers without streaming answer with the whole list
+          onArticles(<NewsArticle[]>(await response.json()));
+          return;
+        }
+
+        const reader = response.body.pipeThrough(new TextDecoderStream()).getReader();
+        let pending = "";
+        for (;;) {
+          const { done, value } = await reader.read();
+          if (done) {
+            break;
+          }
+          const lines = (pending + value).split("\n");
+          pending = lines.pop() || "";
+          onArticles(lines.filter(line => line).map(line => <NewsArticle>JSON.parse(line)));
+        }
+        if (pending) {
+          onArticles([<NewsArticle>JSON.parse(pending)]);
+        }
+        return;
+      } else {
+        Logger.log("Failed to load content for " + path + " with status " + response.status + ": " + response.statusText);
+      }
+    } catch (err: unknown) {
+      Logger.log("Failed to load content: ");
+      if (typeof err === "string") {
+        Logger.log(err);
+      } else if (err instanceof Error) {
+        Logger.log(err.message);
+      }
+    }
+
+    return Promise.reject(new Error("Failed to load content"));
+  }
+
   static async getAppProperties(): Promise<Map<string, string>> {
     try {
         // TODO setup url for dev
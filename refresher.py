@@ -0,0 +1,166 @@
+# Copyright (c) 2016 Clarence Ho (clarenceho at gmail dot com)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from bulkhead import BulkheadFull
+from logger import logger
+
+REFRESH_WORKERS = 4
+# how often the scheduler checks for sources due for a refresh (seconds)
+REFRESH_TICK = 30
+# after a failed refresh a source is left alone this long (seconds), doubled on
+# each further failure up to REFRESH_BACKOFF_MAX
+REFRESH_BACKOFF = 60
+REFRESH_BACKOFF_MAX = 3600
+
+
+def has_articles(articles):
+    """A result is worth keeping if at least one section has an article in it"""
+    return any("url" in item for item in articles)
+
+
+class Refresher:
+    """Keep the article cache of every source warm from a background worker pool"""
+
+    def __init__(
+        self,
+        sources,
+        cache,
+        max_workers=REFRESH_WORKERS,
+        tick=REFRESH_TICK,
+        bulkhead=None,
+    ):
+        self._sources = sources
+        self._cache = cache
+        self._bulkhead = bulkhead
+        self._tick = tick
+        self._max_workers = max_workers
+        self._executor = None
+        self._lock = threading.Lock()
+        self._pending = set()
+        # source id -> (consecutive failed refreshes, monotonic time of next try)
+        self._backoff = {}
+        self._stopped = threading.Event()
+        self._refreshed = 0
+        self._failed = 0
+
+    def start(self):
+        """Start the scheduler thread. Safe to call more than once"""
+        with self._lock:
+            if self._executor is not None:
+                return
+            self._executor = ThreadPoolExecutor(
+                max_workers=self._max_workers, thread_name_prefix="refresher"
+            )
+        threading.Thread(target=self._run, name="refresher", daemon=True).start()
+
+    def stop(self):
+        self._stopped.set()
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def refresh(self, source_id):
+        """Queue a refresh of one source unless one is already queued or running,
+        or its last refreshes failed and it is backing off"""
+        with self._lock:
+            if self._executor is None or source_id in self._pending:
+                return
+            backoff = self._backoff.get(source_id)
+            if backoff is not None and time.monotonic() < backoff[1]:
+                return
+            self._pending.add(source_id)
+        self._executor.submit(self._refresh, source_id)
+
+    def get_stats(self):
+        now = time.monotonic()
+        with self._lock:
+            return {
+                "running": self._executor is not None and not self._stopped.is_set(),
+                "workers": self._max_workers,
+                "pending": len(self._pending),
+                "refreshed": self._refreshed,
+                "failed": self._failed,
+                "backing_off": sum(
+                    1 for _, next_try in self._backoff.values() if now < next_try
+                ),
+            }
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._refresh_due()
+            self._stopped.wait(self._tick)
+
+    def _refresh_due(self):
+        for source_id in self._sources:
+            _, expires_in = self._cache.peek(source_id)
+            # refresh a little ahead of expiry so readers rarely see stale data
+            if expires_in <= self._tick:
+                self.refresh(source_id)
+
+    def _load(self, source):
+        if self._bulkhead is None:
+            return source.get_articles()
+        # refreshes take their turn with the requests scraping the source
+        return self._bulkhead.run(source.get_bulkhead(), source.get_articles)
+
+    def _refresh(self, source_id):
+        source = self._sources[source_id]
+        loaded = []
+
+        def _load():
+            articles = self._load(source)
+            loaded.append(articles)
+            return articles
+
+        try:
+            self._cache.refresh(
+                source_id, _load, source.get_cache_ttl(), accept=has_articles
+            )
+            # a flight shared with a request loads nothing here, which is fine
+            if loaded and not has_articles(loaded[0]):
+                # e.g. a redesigned site answering 200 without any matching node
+                logger.info("Refresh of " + source_id + " found no article")
+                self._back_off(source_id)
+            else:
+                with self._lock:
+                    self._refreshed += 1
+                    self._backoff.pop(source_id, None)
+        except BulkheadFull:
+            # the source is busy. The next tick tries again
+            logger.info("Skipped refreshing " + source_id + ": bulkhead full")
+        except Exception as e:
+            self._back_off(source_id)
+            logger.exception("Problem refreshing " + source_id + ": " + str(e))
+            logger.exception(traceback.format_exception(e))
+        finally:
+            with self._lock:
+                self._pending.discard(source_id)
+
+    def _back_off(self, source_id):
+        with self._lock:
+            self._failed += 1
+            failures, _ = self._backoff.get(source_id, (0, 0))
+            delay = min(REFRESH_BACKOFF * 2**failures, REFRESH_BACKOFF_MAX)
+            self._backoff[source_id] = (failures + 1, time.monotonic() + delay)
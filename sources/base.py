@@ -20,15 +20,86 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
+import hashlib
+import html
+import threading
 import traceback
 from abc import ABCMeta, abstractmethod
+from concurrent.futures import Future, ThreadPoolExecutor
 
 from lxml import etree
-import html
+from lxml import html as lxml_html
 
-from fetcher import read_http_page
+from bulkhead import get_current as get_current_bulkhead
+from cache import DEFAULT_TTL, ArticleCache
+from deadline import bind_context, is_expired
+from fetcher import MAX_BODY_SIZE, read_http_page, report_failure
 from logger import logger
 
+from .extract import extract_html
+from .feeds import iter_feed
+
+# default max number of pages a source fetches at the same time
+MAX_CONCURRENCY = 6
+# threads of each level of the pool the pages of a bulkhead are fetched on
+POOL_WORKERS = 16
+# articles parsed from each page body, so that an unchanged page isn't parsed again
+PARSE_CACHE_BYTES = 16 * 1024 * 1024
+# default max number of articles taken from a feed, None for all of them
+MAX_ITEMS_PER_SECTION = None
+# articles of each section, kept after they expire to stand in for a failed fetch
+SECTION_CACHE_BYTES = 32 * 1024 * 1024
+
+_parse_cache = ArticleCache(max_bytes=PARSE_CACHE_BYTES)
+_section_cache = ArticleCache(max_bytes=SECTION_CACHE_BYTES)
+
+
+# long-lived threads, so that the curl handle each keeps per session (and its
+# connections) is reused from one scrape to the next. Each bulkhead has pools of
+# its own, so that the pages of slow sources can't take the threads of others.
+# Work submitted from a pool thread (e.g. the pages of a section) goes to the next
+# level, so that threads never wait on work queued behind them
+_pools = {}
+_pools_lock = threading.Lock()
+_pool_level = threading.local()
+
+
+def _get_pool(bulkhead, level):
+    with _pools_lock:
+        pool = _pools.get((bulkhead, level))
+        if pool is None:
+            prefix = "pages-" if bulkhead is None else f"pages-{bulkhead}-"
+            pool = ThreadPoolExecutor(
+                max_workers=POOL_WORKERS, thread_name_prefix=f"{prefix}{level}"
+            )
+            _pools[(bulkhead, level)] = pool
+        return pool
+
+
+def get_parse_cache_stats():
+    """Number of page bodies parsed (misses) and reused from an earlier parse (hits)"""
+    return _parse_cache.get_stats()
+
+
+def get_section_cache_stats():
+    """Sections reused before their TTL (hits), re-read (misses) and served from an
+    expired entry because the re-read failed (stale_hits)"""
+    return _section_cache.get_stats()
+
+
+def is_complete(articles):
+    """Whether every section of a result was read, rather than cut by a deadline"""
+    return not any(item.get("pending") for item in articles)
+
+
+def mark_pending(articles):
+    """Mark the sections without articles as pending, for results of sources that
+    don't tell the sections cut by the deadline from empty ones"""
+    for item, next_item in zip(articles, articles[1:] + [None]):
+        if "url" not in item and (next_item is None or "url" not in next_item):
+            item["pending"] = True
+    return articles
+
 
 class BaseSource:
     __metaclass__ = ABCMeta
@@ -49,6 +120,176 @@ class BaseSource:
     def get_icon_url(self):
         return None
 
+    def iter_articles(self):
+        """Yield the sections and articles of get_articles() as they are read"""
+        yield from self.get_articles()
+
+    def get_max_concurrency(self):
+        """Max number of pages of this source fetched at the same time"""
+        return MAX_CONCURRENCY
+
+    def get_max_body_size(self):
+        """Pages of this source larger than this (bytes) are not downloaded"""
+        return MAX_BODY_SIZE
+
+    def get_bulkhead(self):
+        """Name of the bulkhead the scrapes of this source run in. Sources sharing
+        one share its threads"""
+        return self.get_id()
+
+    def get_hedge_requests(self):
+        """Whether slow page fetches of this source are hedged with a second request"""
+        return False
+
+    def map_concurrently(self, fn, items):
+        """Apply fn to items on a bounded thread pool. Results are in input order"""
+        return list(self.iter_concurrently(fn, items))
+
+    def iter_concurrently(self, fn, items):
+        """Like map_concurrently, but yield each result as soon as it and the ones
+        before it are ready"""
+        items = list(items)
+        workers = min(self.get_max_concurrency(), len(items))
+        if workers <= 1:
+            for item in items:
+                yield fn(item)
+            return
+
+        level = getattr(_pool_level, "value", 0)
+        pool = _get_pool(get_current_bulkhead(), level)
+        # the items run under the deadline of the caller
+        bound = bind_context(fn)
+        results = [Future() for _ in items]
+        next_items = iter(range(len(items)))
+        lock = threading.Lock()
+        stopped = False
+
+        def _start_next():
+            with lock:
+                index = None if stopped else next(next_items, None)
+            if index is not None:
+                pool.submit(_run, index)
+
+        def _run(index):
+            _pool_level.value = level + 1
+            try:
+                results[index].set_result(bound(items[index]))
+            except BaseException as e:
+                results[index].set_exception(e)
+            finally:
+                # at most `workers` items of this call run at the same time
+                _start_next()
+
+        for _ in range(workers):
+            _start_next()
+        try:
+            for result in results:
+                yield result.result()
+        finally:
+            # a consumer that stops early doesn't wait for the items not started
+            with lock:
+                stopped = True
+
+    def get_paged_articles(
+        self, fetch_page, parse_page, num_pages=1, discover_pages=None, max_pages=None
+    ):
+        """Fetch pages 1..num_pages concurrently and merge their articles in page order.
+
+        fetch_page(page) returns a parsed page, parse_page(doc) the articles in it.
+        If discover_pages(doc) is given, it returns the highest page number a page
+        links to, and newly discovered pages (up to max_pages) are fetched together
+        in the next round. Articles with a URL already seen are dropped.
+        """
+
+        def _fetch(page):
+            try:
+                return fetch_page(page)
+            except Exception as e:
+                logger.exception(
+                    f"Problem fetching page {page} of {self.get_id()}: {str(e)}"
+                )
+                logger.exception(traceback.format_exception(e))
+            return None
+
+        max_pages = max_pages or num_pages
+        docs = []
+        known_pages = min(num_pages, max_pages)
+        while len(docs) < known_pages:
+            batch = range(len(docs) + 1, known_pages + 1)
+            for doc in self.map_concurrently(_fetch, batch):
+                docs.append(doc)
+                if discover_pages and doc is not None:
+                    known_pages = max(known_pages, min(discover_pages(doc), max_pages))
+
+        result_list = []
+        seen_url = set()
+        for doc in docs:
+            if doc is None:
+                continue
+            for article in parse_page(doc):
+                if article["url"] not in seen_url:
+                    seen_url.add(article["url"])
+                    result_list.append(article)
+        return result_list
+
+    def parse_memoized(self, data, parse):
+        """Return parse(data), reusing the result of an earlier call on the same bytes.
+
+        parse must only depend on data (and on constants of the source) and return a
+        list of sections / articles.
+        """
+        if not data:
+            return parse(data)
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        key = (
+            self.get_id(),
+            parse.__qualname__,
+            hashlib.blake2b(data, digest_size=16).digest(),
+        )
+        articles = _parse_cache.get(key, lambda: parse(data), float("inf"))
+        # callers own the dicts they get back
+        return [dict(article) for article in articles]
+
+    def get_cache_ttl(self):
+        """Seconds the server keeps the articles of this source before re-fetching"""
+        return DEFAULT_TTL
+
+    def get_section_ttl(self, title, url):
+        """Seconds the articles of a section are reused before it is re-read.
+
+        Sections are only re-read when the whole source is, and a section is only
+        reused if it stays fresh for as long as the new result of the source is
+        kept. Values up to get_cache_ttl() thus mean re-read on every scrape.
+        """
+        return self.get_cache_ttl()
+
+    def get_cached_section(self, title, url, load):
+        """The section title followed by its articles, from load() unless read
+        within its TTL.
+
+        If load() fails or finds no article, the last articles read from the
+        section are returned instead, however old. A section with neither that
+        ran out of request deadline is marked pending.
+        """
+        section = self.create_section(title)
+        articles = _section_cache.get(
+            (self.get_id(), url),
+            load,
+            self.get_section_ttl(title, url),
+            accept=bool,
+            # a section must not outlive its TTL inside the result it goes into.
+            # Otherwise a refresh ahead of expiry re-serves sections read by the
+            # previous scrape, and articles end up twice as old as the TTL
+            min_fresh=self.get_cache_ttl(),
+        )
+        if not articles:
+            if is_expired():
+                section["pending"] = True
+            return [section]
+        # callers own the dicts they get back
+        return [section] + [dict(article) for article in articles]
+
     def create_section(self, title):
         return {"title": title}
 
@@ -63,57 +304,203 @@ class RSSBase(BaseSource):
     def get_rss_links(self):
         return []
 
+    def get_max_items_per_section(self):
+        """Max number of articles taken from each feed, None for all of them"""
+        return MAX_ITEMS_PER_SECTION
+
     def get_articles(self):
+        return list(self.iter_articles())
+
+    def iter_articles(self):
+        # sections are fetched concurrently but kept in their original order
+        for section in self.iter_concurrently(
+            lambda link: self.get_rss_section(*link), self.get_rss_links()
+        ):
+            yield from section
+
+    def get_rss_section(self, name, url):
+        # the section title, then the articles of the feed
+        return self.get_cached_section(name, url, lambda: self.read_rss_section(url))
+
+    def read_rss_section(self, url):
+        try:
+            data = read_http_page(
+                url,
+                hedge=self.get_hedge_requests(),
+                max_size=self.get_max_body_size(),
+            )
+            if data:
+                articles = self.parse_memoized(data, self.parse_feed)
+                if not articles:
+                    # a feed without items is as good as a broken one
+                    report_failure(url)
+                return articles
+        except Exception as e:
+            logger.exception("Problem processing feed: " + str(e))
+            logger.exception(traceback.format_exception(e))
+        return []
+
+    def parse_feed(self, data):
         result_list = []
-        for name, url in self.get_rss_links():
-            try:
-                # for each section, insert a title...
-                result_list.append(self.create_section(name))
-                # ... then parse the page and extract article links
-                data = read_http_page(url)
-                if data:
-                    doc = etree.fromstring(data, parser=etree.XMLParser(recover=True))
-                    for entry in doc.xpath("//rss/channel/item"):
-                        title = entry.xpath("title")[0].text
-                        link = entry.xpath("link")[0].text
-                        abstract = html.unescape(entry.xpath("description")[0].text)
-                        result_list.append(
-                            self.create_article(title.strip(), link, abstract)
-                        )
-            except Exception as e:
-                logger.exception("Problem processing rss: " + str(e))
-                logger.exception(traceback.format_exception(e))
+        for entry in iter_feed(data, self.get_max_items_per_section()):
+            if entry["title"] and entry["link"]:
+                abstract = entry["description"]
+                result_list.append(
+                    self.create_article(
+                        entry["title"].strip(),
+                        entry["link"],
+                        html.unescape(abstract) if abstract else None,
+                    )
+                )
         return result_list
 
 
 class RDFBase(RSSBase):
+    """RSS 1.0 (RDF) feeds. RSSBase reads them too, this is kept for existing sources"""
+
+    __metaclass__ = ABCMeta
+
+
+def _compile(xpath):
+    return etree.XPath(xpath) if isinstance(xpath, str) else xpath
+
+
+def _select(xpath, item):
+    if xpath is None:
+        return item
+    found = xpath(item)
+    return found[0] if found else None
+
+
+class ArticleSelector:
+    """Where the articles are in a page.
+
+    items selects one element per article. Relative to it, title selects the element
+    with the title text, link the one with the URL (in link_attribute) and abstract
+    the one with the abstract text. None selects the item itself, except for link,
+    which defaults to the title element. XPaths are given as strings or etree.XPath.
+    """
+
+    def __init__(
+        self, items, title=None, link=None, abstract=None, link_attribute="href"
+    ):
+        self.items = _compile(items)
+        self.title = _compile(title)
+        self.link = _compile(link)
+        self.abstract = _compile(abstract)
+        self.link_attribute = link_attribute
+
+
+class HTMLBase(BaseSource):
+    """Scraper of HTML section pages described by sections and ArticleSelectors.
+
+    Sections are fetched concurrently and a failing section doesn't affect the
+    others. Pages are parsed once per distinct body, with only the parts in
+    get_scopes() built if given.
+    """
+
     __metaclass__ = ABCMeta
 
+    @abstractmethod
+    def get_sections(self):
+        """[(title, url)], or [(title, url, number of pages)] for paged sections"""
+        return []
+
+    @abstractmethod
+    def get_selectors(self):
+        """ArticleSelectors of a page. Their articles are listed in this order"""
+        return []
+
+    def get_base_url(self):
+        """Prefix of the article links, for sites with relative links"""
+        return ""
+
+    def get_scopes(self):
+        """extract.Scope of the elements holding the articles, None to parse it all"""
+        return None
+
+    def get_max_scopes(self):
+        """Number of scope elements in a page, if known. Parsing stops after them"""
+        return None
+
+    def get_encoding(self):
+        """Encoding of the pages, if they don't declare the right one"""
+        return None
+
+    def get_page_url(self, url, page):
+        """URL of a page of a paged section"""
+        return url
+
+    def fetch_page(self, url):
+        return read_http_page(
+            url, hedge=self.get_hedge_requests(), max_size=self.get_max_body_size()
+        )
+
     def get_articles(self):
+        return list(self.iter_articles())
+
+    def iter_articles(self):
+        # sections are fetched concurrently but kept in their original order
+        for section in self.iter_concurrently(
+            lambda section: self.get_section(*section), self.get_sections()
+        ):
+            yield from section
+
+    def get_section(self, title, url, num_pages=1):
+        # the section title, then the articles of its pages
+        return self.get_cached_section(
+            title, url, lambda: self.read_section(url, num_pages)
+        )
+
+    def read_section(self, url, num_pages=1):
+        try:
+            return self.get_paged_articles(
+                lambda page: self.fetch_page(self.get_page_url(url, page)),
+                lambda data: self.parse_memoized(data, self.parse_page),
+                num_pages=num_pages,
+            )
+        except Exception as e:
+            logger.exception(f"Problem processing {self.get_id()} {url}: {str(e)}")
+            logger.exception(traceback.format_exception(e))
+        return []
+
+    def parse_page(self, data):
+        scopes = self.get_scopes()
+        encoding = self.get_encoding()
+        if scopes:
+            doc = extract_html(data, scopes, self.get_max_scopes(), encoding)
+        elif encoding:
+            doc = lxml_html.document_fromstring(
+                data, parser=lxml_html.HTMLParser(encoding=encoding)
+            )
+        else:
+            doc = lxml_html.document_fromstring(data)
+
+        base_url = self.get_base_url()
         result_list = []
-        for name, url in self.get_rss_links():
-            try:
-                # for each section, insert a title...
-                result_list.append(self.create_section(name))
-                # ... then parse the page and extract article links
-                doc = etree.fromstring(
-                    read_http_page(url), parser=etree.XMLParser(recover=True)
+        for selector in self.get_selectors():
+            for item in selector.items(doc):
+                title = _select(selector.title, item)
+                link = title if selector.link is None else _select(selector.link, item)
+                if title is None or link is None:
+                    continue
+                href = link.get(selector.link_attribute)
+                if not title.text or not href:
+                    continue
+                abstract = (
+                    None
+                    if selector.abstract is None
+                    else _select(selector.abstract, item)
+                )
+                result_list.append(
+                    self.create_article(
+                        title.text.strip(),
+                        base_url + href,
+                        (
+                            abstract.text.strip()
+                            if abstract is not None and abstract.text
+                            else None
+                        ),
+                    )
                 )
-
-                for entry in doc.xpath(
-                    '//*[local-name()="RDF"]/*[local-name()="item"]'
-                ):
-                    titles = entry.xpath('*[local-name()="title"]')
-                    links = entry.xpath('*[local-name()="link"]')
-                    abstracts = entry.xpath('*[local-name()="description"]')
-                    if titles and links:
-                        title = titles[0].text
-                        link = links[0].text
-                        abstract = abstracts[0].text if abstracts else ""
-                        result_list.append(
-                            self.create_article(title.strip(), link, abstract)
-                        )
-            except Exception as e:
-                logger.exception("Problem processing rdf: " + str(e))
-                logger.exception(traceback.format_exception(e))
         return result_list
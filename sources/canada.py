@@ -20,70 +20,40 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
-import traceback
-from abc import ABCMeta, abstractmethod
-
-from lxml import html
+from abc import ABCMeta
 
 from fetcher import read_http_page
-from logger import logger
 
-from .base import BaseSource, RSSBase
+from .base import ArticleSelector, HTMLBase, RSSBase
+
+SINGTAO_TOP_STORY = ArticleSelector(
+    '(//div[@class="td-ss-main-content"])[1]/div[@class="cat-header-image"]/a',
+    title="div/h3",
+    link=".",
+)
+SINGTAO_STORIES = ArticleSelector(
+    '(//div[@class="td-ss-main-content"])[1]/div[contains(@class, "td-animation-stack")]/div[@class="item-details"]/h3/a'
+)
 
 
-class SingTaoCanada(BaseSource):
+class SingTaoCanada(HTMLBase):
     __metaclass__ = ABCMeta
 
-    @abstractmethod
-    def get_sections(self):
-        pass
-
-    def get_articles(self):
-        result_list = []
-        sections = self.get_sections()
-
-        try:
-            for title, url, pages in sections:
-                # for each section, insert a title...
-                result_list.append(self.create_section(title))
-                for page in range(1, pages + 1):
-                    # ... then parse the page and extract article links
-                    doc = html.document_fromstring(
-                        read_http_page(
-                            url + "&page=" + str(page), {"edition": "vancouver"}
-                        ).decode("utf-8")
-                    )
-
-                    # top story
-                    top_story_link = doc.xpath(
-                        '(//div[@class="td-ss-main-content"])[1]/div[@class="cat-header-image"]/a'
-                    )
-                    top_story_text = doc.xpath(
-                        '(//div[@class="td-ss-main-content"])[1]/div[@class="cat-header-image"]/a/div/h3'
-                    )
-                    if top_story_link and top_story_text:
-                        result_list.append(
-                            self.create_article(
-                                top_story_text[0].text.strip(),
-                                top_story_link[0].get("href"),
-                            )
-                        )
-
-                    for topic in doc.xpath(
-                        '(//div[@class="td-ss-main-content"])[1]/div[contains(@class, "td-animation-stack")]/div[@class="item-details"]/h3/a'
-                    ):
-                        if topic.text and topic.get("href"):
-                            result_list.append(
-                                self.create_article(
-                                    topic.text.strip(), topic.get("href")
-                                )
-                            )
-
-        except Exception as e:
-            logger.exception("Problem processing SingTaoCanada: " + str(e))
-            logger.exception(traceback.format_exception(e))
-
-        return result_list
+    def get_selectors(self):
+        return [SINGTAO_TOP_STORY, SINGTAO_STORIES]
+
+    def get_bulkhead(self):
+        # the editions are pages of the same site
+        return "singtaocanada"
+
+    def get_encoding(self):
+        return "utf-8"
+
+    def get_page_url(self, url, page):
+        return url + "&page=" + str(page)
+
+    def fetch_page(self, url):
+        return read_http_page(url, {"edition": "vancouver"})
 
     def get_icon_url(self):
         return "data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAACAAAAAgCAMAAABEpIrGAAAAflBMVEU2THk2THk2THk2THk2THk2THkySXd8iKN0gJ1LWH4rRHQkQ3RRZ4wAA0ceO25CR3CIkKi1h5rDdYTXg4w2THllcJD////BxtK3vMvEAB/RSVjT1t9/c5DEDy2TnLKgqbzNMkPrur7RXGnk5uv57u/kp62rssLxzc/DorEFLWeqHjCtAAAAFXRSTlMCK6X/42f//////////////////9iJg58gAAAByklEQVR4AYWTh2KbMBBAMXK0rZ6HpCO4Og+ihP//wR5hdLePLb0brKZpdq34M/t21zAv4h+8cDwf5Mrvxq6Z8iu9YKSQ1m1wQNtwvDeHQ/gyAd7642nl7KW4sCBYiCkjYk7ZnbuNVxb2SwZI/UTqr93XjVUQn0LhRmASuk35MUOgUlKvr+p6uz+Y19ffMvTPNPRPhDS8McPQ/ZzBYMX0rJWuw0/CliFcIyeJESbhfr+/v/0oiHiA50yehImfBKn9YSGycJ/4OYP1eiHCuUtvt/OZe+gePMXChFxxJb2nYUjvQ9fdjm4TNqQ+Tnz0H6ejdlsGZxlnBW/BuTAGx2sIm+CQSBUsFjKRsCVX23uTKdtFCAmJR5OpgwYhxsHrnONzTHIRrIZEmeBJiSdlGHympH4UCqEuMKJGQiMtRjUW4PO1hAh25P7kZ2OSj9ZKbjeErcl+7KPyqqqohEE+0yrKqNRWgmpFVXWhQtpUQkkaQy3FrCU8RK08QFTgRQHtALRSCGIVuK50BYLj6lzb6RCklMZ+CnsxY+sISEAFSRNlnpSCuTTtKqAiQE+18EnF9Sdr+ddbDWElL7wKLiQW/vfz7hpm1172f+TS8uw3poU3cVjsnpwAAAAASUVORK5CYII="
@@ -0,0 +1,104 @@
+# Copyright (c) 2016 Clarence Ho (clarenceho at gmail dot com)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+from lxml import etree
+
+# pages are fed to the parser in chunks of this size, so that parsing can stop once
+# every expected scope has been seen
+FEED_CHUNK_SIZE = 16 * 1024
+
+
+class Scope:
+    """Selects the elements named tag (any tag if None) with an attribute containing
+    a value, like the XPath step tag[contains(@attribute, "contains")]"""
+
+    def __init__(self, tag=None, attribute=None, contains=""):
+        self.tag = tag
+        self.attribute = attribute
+        self.contains = contains
+
+    def matches(self, tag, attrib):
+        if self.tag is not None and tag != self.tag:
+            return False
+        if self.attribute is None:
+            return True
+        return self.contains in attrib.get(self.attribute, "")
+
+
+class _ScopeTarget:
+    """Parser target that builds only the subtrees of the elements matching a scope.
+
+    They are kept in document order under a synthetic <html><body>, so that XPaths
+    written for the whole page (e.g. //div[...]/a) still find them.
+    """
+
+    def __init__(self, scopes):
+        self._scopes = scopes
+        self._tags = {scope.tag for scope in scopes}
+        self._builder = None
+        self._depth = 0
+        self.count = 0
+        self.root = etree.Element("html")
+        self._body = etree.SubElement(self.root, "body")
+
+    def start(self, tag, attrib):
+        if self._depth:
+            self._depth += 1
+            self._builder.start(tag, attrib)
+        elif (tag in self._tags or None in self._tags) and any(
+            scope.matches(tag, attrib) for scope in self._scopes
+        ):
+            self._depth = 1
+            self._builder = etree.TreeBuilder()
+            self._builder.start(tag, attrib)
+
+    def end(self, tag):
+        if self._depth:
+            self._builder.end(tag)
+            self._depth -= 1
+            if not self._depth:
+                self._body.append(self._builder.close())
+                self._builder = None
+                self.count += 1
+
+    def data(self, data):
+        if self._depth:
+            self._builder.data(data)
+
+    def close(self):
+        return self.root
+
+
+def extract_html(data, scopes, max_scopes=None, encoding=None):
+    """Parse only the parts of a HTML page inside the elements matching scopes.
+
+    Everything outside them is discarded as it is parsed instead of being built into
+    a DOM. With max_scopes, parsing stops once that many elements were captured,
+    and encoding overrides the one declared by the page. Returns the synthetic
+    <html> root holding the captured elements.
+    """
+    target = _ScopeTarget(scopes)
+    parser = etree.HTMLParser(target=target, encoding=encoding)
+    for offset in range(0, len(data), FEED_CHUNK_SIZE):
+        end = offset + FEED_CHUNK_SIZE
+        parser.feed(data[offset:end])
+        if max_scopes is not None and target.count >= max_scopes:
+            break
+    return parser.close()
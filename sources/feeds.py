@@ -0,0 +1,136 @@
+# Copyright (c) 2016 Clarence Ho (clarenceho at gmail dot com)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import io
+
+from lxml import etree
+
+RSS = "rss"
+RDF = "rdf"
+ATOM = "atom"
+
+RDF_NS = "http://www.w3.org/1999/02/22-rdf-syntax-ns#"
+RSS1_NS = "http://purl.org/rss/1.0/"
+RSS090_NS = "http://my.netscape.com/rdf/simple/0.9/"
+ATOM_NS = "http://www.w3.org/2005/Atom"
+DC_NS = "http://purl.org/dc/elements/1.1/"
+
+_ROOTS = {
+    "rss": RSS,
+    f"{{{RDF_NS}}}RDF": RDF,
+    f"{{{ATOM_NS}}}feed": ATOM,
+}
+
+# item elements of each dialect, and the local name of the element they are in
+_ITEMS = {
+    RSS: ({"item"}, "channel"),
+    RDF: ({f"{{{RSS1_NS}}}item", f"{{{RSS090_NS}}}item"}, "RDF"),
+    ATOM: ({f"{{{ATOM_NS}}}entry"}, "feed"),
+}
+
+# child elements of an item -> field of the entry
+_FIELDS = {
+    RSS: {
+        "title": "title",
+        "link": "link",
+        "description": "description",
+        "guid": "guid",
+        "pubDate": "published",
+    },
+    RDF: {
+        **{
+            f"{{{ns}}}{name}": name
+            for ns in (RSS1_NS, RSS090_NS)
+            for name in ("title", "link", "description")
+        },
+        f"{{{DC_NS}}}date": "published",
+    },
+    ATOM: {
+        f"{{{ATOM_NS}}}title": "title",
+        f"{{{ATOM_NS}}}summary": "description",
+        f"{{{ATOM_NS}}}id": "guid",
+        f"{{{ATOM_NS}}}published": "published",
+        f"{{{ATOM_NS}}}updated": "updated",
+    },
+}
+
+_ATOM_LINK = f"{{{ATOM_NS}}}link"
+_ALL_ITEMS = sorted(set().union(*(tags for tags, _ in _ITEMS.values())))
+
+
+def get_dialect(root):
+    """RSS, RDF or ATOM for the root element of a feed, None if it is not a feed"""
+    return _ROOTS.get(root.tag)
+
+
+def _read_entry(dialect, item):
+    entry = dict.fromkeys(("title", "link", "description", "guid", "published"))
+    fields = _FIELDS[dialect]
+    for child in item:
+        if child.tag == _ATOM_LINK:
+            if entry["link"] is None and child.get("rel", "alternate") == "alternate":
+                entry["link"] = child.get("href")
+            continue
+        field = fields.get(child.tag)
+        if field is not None and entry.get(field) is None:
+            entry[field] = child.text
+
+    if dialect == RDF:
+        entry["guid"] = item.get(f"{{{RDF_NS}}}about")
+    elif dialect == ATOM:
+        updated = entry.pop("updated", None)
+        if entry["published"] is None:
+            entry["published"] = updated
+    return entry
+
+
+def iter_feed(data, max_items=None):
+    """Yield the entries of a RSS 2.0, RSS 1.0 (RDF) or Atom feed as it is parsed.
+
+    Each entry is a dict of title, link, description, guid and published (None if
+    absent). The dialect is taken from the root element. Items are cleared once
+    read, and parsing stops after max_items.
+    """
+    dialect = None
+    count = 0
+    for _, item in etree.iterparse(
+        io.BytesIO(data), events=("end",), tag=_ALL_ITEMS, recover=True
+    ):
+        if dialect is None:
+            dialect = get_dialect(item.getroottree().getroot())
+            if dialect is None:
+                return
+
+        tags, container_name = _ITEMS[dialect]
+        container = item.getparent()
+        if (
+            item.tag not in tags
+            or container is None
+            or etree.QName(container).localname != container_name
+        ):
+            continue
+
+        yield _read_entry(dialect, item)
+        count += 1
+        item.clear(keep_tail=True)
+        while item.getprevious() is not None:
+            del container[0]
+        if max_items is not None and count >= max_items:
+            return
@@ -25,12 +25,13 @@ import re
 import traceback
 from urllib.parse import urlparse
 
-from lxml import html
+from lxml import etree, html
 
 from fetcher import read_http_page
 from logger import logger
 
-from .base import BaseSource, RSSBase
+from .base import ArticleSelector, BaseSource, HTMLBase, RSSBase
+from .extract import Scope, extract_html
 
 
 class MingPaoHK(RSSBase):
@@ -53,10 +54,30 @@ class MingPaoHK(RSSBase):
             ("副刊", "https://news.mingpao.com/rss/pns/s00005.xml"),
         ]
 
+    def get_section_ttl(self, title, url):
+        # opinion and supplement pages rarely change during the day
+        if title in ("社評‧筆陣", "副刊"):
+            return 4 * self.get_cache_ttl()
+        return self.get_cache_ttl()
+
     def get_icon_url(self):
         return "https://news.mingpao.com/favicon.ico"
 
 
+ORIENTALDAILY_MENU = etree.XPath(
+    '//*[@id="pageCTN"]/header/div[contains(@class, "middle")]/ul[contains(@class, "menuList")]'
+)
+ORIENTALDAILY_MENU_LINKS = etree.XPath("li/a")
+ORIENTALDAILY_MENU_CLASS = etree.XPath("@class")
+ORIENTALDAILY_MENU_HREF = etree.XPath("@href")
+ORIENTALDAILY_SCOPES = [Scope("div", "class", "sectionList")]
+ORIENTALDAILY_ARTICLES = etree.XPath(
+    '//div[contains(@class, "sectionList")]/div[contains(@class, "subsection")]/ul[contains(@class, "items")]/li[@articleid]'
+)
+ORIENTALDAILY_ARTICLE_URL = etree.XPath("a/@href")
+ORIENTALDAILY_ARTICLE_TEXT = etree.XPath('a/div[contains(@class, "text")]/text()')
+
+
 class OrientalDaily(BaseSource):
     def get_id(self):
         return "orientaldaily"
@@ -78,19 +99,17 @@ class OrientalDaily(BaseSource):
         try:
             doc = html.document_fromstring(read_http_page(top_url))
             if doc is not None:
-                menu = doc.xpath(
-                    '//*[@id="pageCTN"]/header/div[contains(@class, "middle")]/ul[contains(@class, "menuList")]'
-                )
+                menu = ORIENTALDAILY_MENU(doc)
                 if menu:
-                    for the_link in menu[0].xpath("li/a"):
-                        the_class = the_link.xpath("@class")
+                    for the_link in ORIENTALDAILY_MENU_LINKS(menu[0]):
+                        the_class = ORIENTALDAILY_MENU_CLASS(the_link)
                         if (
-                            the_link.xpath("@href")
+                            ORIENTALDAILY_MENU_HREF(the_link)
                             and the_class
                             and the_class[0] in sections
                         ):
                             sections[the_class[0]]["url"] = (
-                                top_url + the_link.xpath("@href")[0]
+                                top_url + ORIENTALDAILY_MENU_HREF(the_link)[0]
                             )
         except Exception as e:
             logger.exception("Problem getting OrientalDaily sections: " + str(e))
@@ -99,6 +118,23 @@ class OrientalDaily(BaseSource):
         result_list = []
         base_url = top_url
 
+        def parse_section(data):
+            result = []
+            doc = extract_html(data, ORIENTALDAILY_SCOPES)
+            if doc is not None:
+                articles = ORIENTALDAILY_ARTICLES(doc)
+                for article in articles:
+                    article_urls = ORIENTALDAILY_ARTICLE_URL(article)
+                    article_texts = ORIENTALDAILY_ARTICLE_TEXT(article)
+                    if article_urls and article_texts:
+                        result.append(
+                            self.create_article(
+                                article_texts[0].strip(),
+                                base_url + article_urls[0],
+                            )
+                        )
+            return result
+
         try:
             for _, section in sections.items():
                 title = section["title"]
@@ -107,23 +143,9 @@ class OrientalDaily(BaseSource):
                     # for each section, insert a title...
                     result_list.append(self.create_section(title))
                     # ... then parse the page and extract article links
-                    doc = html.document_fromstring(read_http_page(section_url))
-                    if doc is not None:
-                        articles = doc.xpath(
-                            '//div[contains(@class, "sectionList")]/div[contains(@class, "subsection")]/ul[contains(@class, "items")]/li[@articleid]'
-                        )
-                        for article in articles:
-                            article_urls = article.xpath("a/@href")
-                            article_texts = article.xpath(
-                                'a/div[contains(@class, "text")]/text()'
-                            )
-                            if article_urls and article_texts:
-                                result_list.append(
-                                    self.create_article(
-                                        article_texts[0].strip(),
-                                        base_url + article_urls[0],
-                                    )
-                                )
+                    result_list.extend(
+                        self.parse_memoized(read_http_page(section_url), parse_section)
+                    )
 
         except Exception as e:
             logger.exception("Problem processing OrientalDaily: " + str(e))
@@ -135,6 +157,10 @@ class OrientalDaily(BaseSource):
         return "http://orientaldaily.on.cc/favicon.ico"
 
 
+SINGPAO_TOPICS = etree.XPath('//td/a[contains(@class, "list_title")]')
+SINGPAO_PAGE_LINKS = etree.XPath('//a[contains(@class, "fpagelist_css")]')
+
+
 class SingPao(BaseSource):
     def get_id(self):
         return "singpao"
@@ -156,38 +182,39 @@ class SingPao(BaseSource):
         ]
         base_url = "http://www.singpao.com.hk/"
 
+        def parse_page(doc):
+            return [
+                self.create_article(topic.text.strip(), base_url + topic.get("href"))
+                for topic in SINGPAO_TOPICS(doc)
+                if topic.text and topic.get("href")
+            ]
+
+        def discover_pages(doc):
+            max_page = 1
+            for page_index in SINGPAO_PAGE_LINKS(doc):
+                if page_index.text is not None:
+                    match = re.match(r"^(\d+)$", page_index.text.strip())
+                    if match and match.lastindex == 1:
+                        max_page = max(max_page, int(match.group(1)))
+            return max_page
+
         try:
             for title, url in sections:
                 # for each section, insert a title...
                 result_list.append(self.create_section(title))
-                # ... then parse the page and extract article links
-                page = 1
-                max_page = 1
-                while page <= max_page and page <= max_page_per_section:
-                    doc = html.document_fromstring(
-                        read_http_page(url + "&page=" + str(page))
+                # ... then parse the pages and extract article links. The page
+                # count is only known after the first page so the rest are fetched
+                # together once discovered
+                result_list.extend(
+                    self.get_paged_articles(
+                        lambda page, url=url: html.document_fromstring(
+                            read_http_page(url + "&page=" + str(page))
+                        ),
+                        parse_page,
+                        discover_pages=discover_pages,
+                        max_pages=max_page_per_section,
                     )
-                    page += 1
-
-                    for topic in doc.xpath('//td/a[contains(@class, "list_title")]'):
-                        if topic.text and topic.get("href"):
-                            result_list.append(
-                                self.create_article(
-                                    topic.text.strip(), base_url + topic.get("href")
-                                )
-                            )
-
-                    for page_index in doc.xpath(
-                        '//a[contains(@class, "fpagelist_css")]'
-                    ):
-                        if page_index.text is not None:
-                            match = re.match(r"^(\d+)$", page_index.text.strip())
-                            if (
-                                match
-                                and match.lastindex == 1
-                                and int(match.group(1)) > max_page
-                            ):
-                                max_page = int(match.group(1))
+                )
 
         except Exception as e:
             logger.exception("Problem processing SingPao: " + str(e))
@@ -215,17 +242,23 @@ class HeadlineDaily(RSSBase):
         return "https://www.stheadline.com/favicon.ico"
 
 
-class TaKungPao(BaseSource):
+TAKUNGPAO_SCOPES = [Scope("div", "class", "list_tuwen")]
+TAKUNGPAO_ARTICLES = ArticleSelector(
+    '//div[contains(@class, "list_tuwen")]/div[contains(@class, "content")]',
+    title='ul[contains(@class, "txt")]/li[contains(@class, "title")]/a',
+    abstract='ul[contains(@class, "txt")]/li[contains(@class, "intro")]/a',
+)
+
+
+class TaKungPao(HTMLBase):
     def get_id(self):
         return "takungpao"
 
     def get_desc(self):
         return "大公網"
 
-    def get_articles(self):
-        result_list = []
-
-        sections = [
+    def get_sections(self):
+        return [
             ("港聞", "http://www.takungpao.com.hk/hongkong/"),
             ("內地", "http://www.takungpao.com.hk/mainland/"),
             ("台灣", "http://www.takungpao.com.hk/taiwan/"),
@@ -237,41 +270,11 @@ class TaKungPao(BaseSource):
             ("娛樂", "http://www.takungpao.com.hk/ent/"),
         ]
 
-        try:
-            for title, url in sections:
-                # for each section, insert a title...
-                result_list.append(self.create_section(title))
-                # ... then parse the page and extract article links
-                doc = html.document_fromstring(read_http_page(url))
-
-                for topic in doc.xpath(
-                    '//div[contains(@class, "list_tuwen")]/div[contains(@class, "content")]'
-                ):
-                    title = topic.xpath(
-                        'ul[contains(@class, "txt")]/li[contains(@class, "title")]/a'
-                    )
-                    intro = topic.xpath(
-                        'ul[contains(@class, "txt")]/li[contains(@class, "intro")]/a'
-                    )
+    def get_selectors(self):
+        return [TAKUNGPAO_ARTICLES]
 
-                    if title and title[0].text and title[0].get("href"):
-                        result_list.append(
-                            self.create_article(
-                                title[0].text.strip(),
-                                title[0].get("href"),
-                                (
-                                    intro[0].text.strip()
-                                    if intro and intro[0].text
-                                    else None
-                                ),
-                            )
-                        )
-
-        except Exception as e:
-            logger.exception("Problem processing TaKungPao: " + str(e))
-            logger.exception(traceback.format_exception(e))
-
-        return result_list
+    def get_scopes(self):
+        return TAKUNGPAO_SCOPES
 
     def get_icon_url(self):
         return "data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAABsAAAAbCAMAAAC6CgRnAAAA3lBMVEX////1em33eGviTD/3b2X4cGj0dGjzcWX/+/nwbWLwbV7wa1vrT0LmPTLjT0LtVEbnRjjmhH353tvhQjbjSTvQQTTweHL3dW31eG3qe2r3c2nteGr0hHv3p6P1jobxYljwY1b4uLLwZF3xW1L6zcn+8/L0k437tLD8wLzzi3771dH95+X4a1/xqqTqenPskovkNyjiXFHsr6vwnJTuQTXkYlTjZlzybFryZFHpbmbzXkzzTz/oV03aWEjkUEjqoZvekYvZgXrVc2rSMyjUSj/qubPUV0/QHBPSQzi5QzS18OToAAAB9klEQVQokVXP7XaiMBCA4akoRUgAE7BsbSWKWEsQ/KhWLa2tYMve/w3tBN09Z9+feZiEgX6rdfOvVqul3wV3qlbwC/o6HtwEeKzftps6qvt7fYCm6zgZoJgPj8MwHI/Tdge/uA8guFWhpEKMgI2daIypcf1ipmlawhETiKf94dNsiKPt9h6CLpIlnidJksSGIWNs1EnTFO2usdfB02w0TwxjnvV6+cM4DNN0C+o+U78VjrtYMoBEW1CCIERqQteyLPNmIIj7LGE+B7alrhOF0U5sGrO6GzGYAcw5XUG8Ji8kiiI0FFEU00kMMqeU8qMB7HEfOYcITVjCzlDWNiUOcWkvBogz4hw2IJRtR+uCumT3uiPuYjsBuUd7RxM72+PU5R45KHMXvL/3iOO8Q6iMu66L/OYccBVKcQ1HWVEUdlFwSrXnIXmh2SqzKSVFpOzjw9byZJ31VlJmdLGOYzafTgdFY7bG81gyKZPVYJtlvSMzYpYRQpTZ2vLz8+vr9O1njO0XZZWfVxuPkEqZrWl1rWnlScZJXpdlyT3t7xwaxrfy/O0fk2XJOUd6ewftmsfPsvr52cMEl1G9VRfzPI9zZvTK8gjMu5hbgd0IGl0DMAbydKWLXZF/JZJ9VvhcQ1yZfTGPl2Xtl1fC/6mgwmq/rn3f8//v9x8X+0wbZeWQXAAAAABJRU5ErkJggg=="
@@ -323,6 +326,11 @@ class Etnet(RSSBase):
         return "http://www.etnet.com.hk/favicon.ico"
 
 
+HKET_TOPICS = etree.XPath(
+    '//div[contains(@class, "listing-widget-33") or contains(@class, "listing-widget-4") or contains(@class, "listing-widget-9")]/a[contains(@class, "listing-overlay")]'
+)
+
+
 class HkEt(BaseSource):
     def _is_absolute(self, url):
         return bool(urlparse(url).netloc)
@@ -345,29 +353,33 @@ class HkEt(BaseSource):
         ]
         seen_url = {}
 
+        def parse_page(doc, base_url):
+            result = []
+            for topic in HKET_TOPICS(doc):
+                if topic.text and topic.get("href"):
+                    topic_url = (
+                        topic.get("href")
+                        if self._is_absolute(topic.get("href"))
+                        else base_url + topic.get("href")
+                    )
+                    result.append(self.create_article(topic.text.strip(), topic_url))
+            return result
+
         try:
             for title, base_url, url, pages in sections:
                 # for each section, insert a title...
                 result_list.append(self.create_section(title))
-                # ... then get page and parse
-                for page in range(1, pages + 1):
-                    doc = html.document_fromstring(
+                # ... then get pages and parse
+                for article in self.get_paged_articles(
+                    lambda page, base_url=base_url, url=url: html.document_fromstring(
                         read_http_page(base_url + url + "?p={}".format(page))
-                    )
-                    for topic in doc.xpath(
-                        '//div[contains(@class, "listing-widget-33") or contains(@class, "listing-widget-4") or contains(@class, "listing-widget-9")]/a[contains(@class, "listing-overlay")]'
-                    ):
-                        if topic.text and topic.get("href"):
-                            topic_url = (
-                                topic.get("href")
-                                if self._is_absolute(topic.get("href"))
-                                else base_url + topic.get("href")
-                            )
-                            if topic_url not in seen_url:
-                                seen_url[topic_url] = None
-                                result_list.append(
-                                    self.create_article(topic.text.strip(), topic_url)
-                                )
+                    ),
+                    lambda doc, base_url=base_url: parse_page(doc, base_url),
+                    num_pages=pages,
+                ):
+                    if article["url"] not in seen_url:
+                        seen_url[article["url"]] = None
+                        result_list.append(article)
 
         except Exception as e:
             logger.exception("Problem processing HkEt: " + str(e))
@@ -395,47 +407,47 @@ class HKFP(RSSBase):
         return "data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAACAAAAAgCAMAAABEpIrGAAAA6lBMVEUBSpkASpkDSZsATJYASp8CSZ8ATJIAS5gHRaAGR5kATZMATo0ARpQARZoARZ4AQZ8ARJMCRqguX5U7aZskWJoASJFKcKcSUowAQYpWfaYGUJlQeKRVep9MfaEAPaCQs9C61uQAPJB5nLfO6PQAPXj1//9HZJkANZmnvtPN4fUAK4Wot8zo9fmvzuC7y9yp0OsANHvK29/Z5vTE4eiWrcW90NkANpA2Wo2yw816lrYAInZZjLO6vdFUfJdMZJ9ke5YATJg6b6uVr8IAM4Hw+P+busauxMmXw9y73ekAMaGRqMp3o8MoYadIcp1yIsk7AAABNklEQVR4Ae2KxWFcQRBEq3rw8/Kame0gJgA5aEMCBjEza1nMOuomOOo1dxUeuAXktfuiRBShjXUGyjofa6VgjYtj46w2TABRTtLMMU+hldUeUZEXJRMV6YWhDFCgvWYLlTMhNxvkfgRyuey5ZzZEjghjqyRbFV7jyOLfGY6EClG9bj+gSFHu6oU+0hPftXAn7qBOgdKH9AmzjSdbTlJWOl78+tZJN9veetzuHqgTjfBT4SB9tYUqD0CcPKd57P1O8z33TnEAOfmdIIefTbA6P9xeefN1cS3p/O1hvTV+3AcgEqM13R3eW8djfDt+P1jFWX92H/J5c7GlTqtnCKYehhr1tNaoP47x+nGlWk1E0u9DqUgIDnBSD1mmJM+UDykjlefiXSjpIAIIriBBAgR5VQRI4oF75RzAclTMSCwV7QAAAABJRU5ErkJggg=="
 
 
-class HKEJ(BaseSource):
+# the drop down list of the articles of the section
+HKEJ_SCOPES = [Scope("div", "class", "more-articles-dd-wrapper")]
+HKEJ_ARTICLES = ArticleSelector(
+    '//div[contains(@class, "more-articles-dd-wrapper")]/form/select/option',
+    link_attribute="value",
+)
+
+
+class HKEJ(HTMLBase):
     def get_id(self):
         return "hkej"
 
     def get_desc(self):
         return "信報財經"
 
-    def get_articles(self):
-        result_list = []
-        root_url = "https://www1.hkej.com"
-        sections = [
-            ("要聞", "/dailynews"),
-            ("理財投資", "/dailynews/investment"),
-            ("時事評論", "/dailynews/commentary"),
-            ("財經新聞", "/dailynews/finnews"),
-            ("地產市道", "/dailynews/property"),
-            ("政壇脈搏", "/dailynews/politics"),
-            ("獨眼", "/dailynews/views"),
-            ("兩岸消息", "/dailynews/cntw"),
-            ("EJ Global", "/dailynews/international"),
-            ("副刊文化", "/dailynews/culture"),
+    def get_sections(self):
+        root_url = self.get_base_url()
+        return [
+            ("要聞", root_url + "/dailynews"),
+            ("理財投資", root_url + "/dailynews/investment"),
+            ("時事評論", root_url + "/dailynews/commentary"),
+            ("財經新聞", root_url + "/dailynews/finnews"),
+            ("地產市道", root_url + "/dailynews/property"),
+            ("政壇脈搏", root_url + "/dailynews/politics"),
+            ("獨眼", root_url + "/dailynews/views"),
+            ("兩岸消息", root_url + "/dailynews/cntw"),
+            ("EJ Global", root_url + "/dailynews/international"),
+            ("副刊文化", root_url + "/dailynews/culture"),
         ]
-        try:
-            for title, base_url in sections:
-                # for each section, insert a title...
-                result_list.append(self.create_section(title))
-                # ... then get page and parse
-                doc = html.document_fromstring(read_http_page(root_url + base_url))
-                for article in doc.xpath(
-                    '//div[contains(@class, "more-articles-dd-wrapper")]/form/select/option'
-                ):
-                    if article.get("value") and article.text:
-                        article_url = root_url + article.get("value")
-                        result_list.append(
-                            self.create_article(article.text.strip(), article_url)
-                        )
-        except Exception as e:
-            logger.exception("Problem processing HKEJ: " + str(e))
-            logger.exception(traceback.format_exception(e))
 
-        return result_list
+    def get_selectors(self):
+        return [HKEJ_ARTICLES]
+
+    def get_base_url(self):
+        return "https://www1.hkej.com"
+
+    def get_scopes(self):
+        return HKEJ_SCOPES
+
+    def get_max_scopes(self):
+        return 1
 
     def get_icon_url(self):
         return "https://www1.hkej.com/favicon.ico"
@@ -461,34 +473,42 @@ class AM730(BaseSource):
             ("體育", "/體育", 2),
             ("專欄", "/column", 5),
         ]
+
+        def fetch_page(url, page):
+            return json.loads(
+                read_http_page(
+                    url,
+                    method="POST",
+                    headers={
+                        "Accept": "application/json",
+                        "Content-Type": "application/x-www-form-urlencoded; charset=UTF-8",
+                        "X-Requested-With": "XMLHttpRequest",
+                    },
+                    body="page={}".format(page),
+                )
+            )
+
+        def parse_page(resp):
+            return [
+                self.create_article(article["title"].strip(), root_url + article["url"])
+                for article in resp["data"]["data"]
+                if article["title"] and article["url"]
+            ]
+
         try:
             for title, base_url, num_pages in sections:
                 # for each section, insert a title...
                 result_list.append(self.create_section(title))
-                for page in range(1, num_pages + 1):
-                    # ... then get page and parse
-                    resp = json.loads(
-                        read_http_page(
-                            root_url + base_url,
-                            method="POST",
-                            headers={
-                                "Accept": "application/json",
-                                "Content-Type": "application/x-www-form-urlencoded; charset=UTF-8",
-                                "X-Requested-With": "XMLHttpRequest",
-                            },
-                            body="page={}".format(page),
-                        )
+                # ... then get pages and parse
+                result_list.extend(
+                    self.get_paged_articles(
+                        lambda page, base_url=base_url: fetch_page(
+                            root_url + base_url, page
+                        ),
+                        parse_page,
+                        num_pages=num_pages,
                     )
-
-                    for article in resp["data"]["data"]:
-                        article_title = article["title"]
-                        article_url = article["url"]
-                        if article_title and article_url:
-                            result_list.append(
-                                self.create_article(
-                                    article_title.strip(), root_url + article_url
-                                )
-                            )
+                )
         except Exception as e:
             logger.exception("Problem processing AM730: " + str(e))
             logger.exception(traceback.format_exception(e))
@@ -20,12 +20,8 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
-import traceback
-from lxml import html
-from fetcher import read_http_page
-from logger import logger
-
-from .base import BaseSource, RDFBase, RSSBase
+from .base import ArticleSelector, HTMLBase, RDFBase, RSSBase
+from .extract import Scope
 
 
 class BBCWorld(RSSBase):
@@ -97,57 +93,38 @@ class WSJChinese(RSSBase):
         return "https://www.wsj.com/favicon.ico"
 
 
-class AP(BaseSource):
+AP_SCOPES = [Scope(tag, "class", "PagePromo-title") for tag in ("h1", "h2", "h3")]
+AP_ARTICLES = ArticleSelector(
+    '//*[self::h1 or self::h2 or self::h3][contains(@class, "PagePromo-title")]',
+    title='a/span[contains(@class, "PagePromoContentIcons-text")]',
+    link='a[contains(@class, "Link")]',
+)
+
+
+class AP(HTMLBase):
     def get_id(self):
         return "ap"
 
     def get_desc(self):
         return "Associated Press"
 
-    def get_articles(self):
-        result_list = []
-
+    def get_sections(self):
         root_url = "https://apnews.com"
-        sections = [
-            ("World", "/world-news"),
-            ("US", "/us-news"),
-            ("Politics", "/politics"),
-            ("Sports", "/sports"),
-            ("Entertainment", "/entertainment"),
-            ("Business", "/business"),
-            ("Science", "/science"),
+        return [
+            ("World", root_url + "/world-news"),
+            ("US", root_url + "/us-news"),
+            ("Politics", root_url + "/politics"),
+            ("Sports", root_url + "/sports"),
+            ("Entertainment", root_url + "/entertainment"),
+            ("Business", root_url + "/business"),
+            ("Science", root_url + "/science"),
         ]
-        try:
-            for title, base_url in sections:
-                # for each section, insert a title...
-                result_list.append(self.create_section(title))
-                # ... then get page and parse
-                doc = html.document_fromstring(read_http_page(root_url + base_url))
-                for article in doc.xpath(
-                    '//*[self::h1 or self::h2 or self::h3][contains(@class, "PagePromo-title")]'
-                ):
-                    the_link = None
-                    the_text = None
-
-                    link_element = article.xpath('a[contains(@class, "Link")]')
-                    if link_element and len(link_element) > 0:
-                        the_link = link_element[0].xpath("@href")[0]
-
-                    text_element = article.xpath(
-                        'a/span[contains(@class, "PagePromoContentIcons-text")]'
-                    )
-                    if text_element and len(text_element) > 0:
-                        the_text = text_element[0].text
-
-                    if the_link and the_text:
-                        result_list.append(
-                            self.create_article(the_text.strip(), the_link)
-                        )
-        except Exception as e:
-            logger.exception("Problem processing AP: " + str(e))
-            logger.exception(traceback.format_exception(e))
-
-        return result_list
+
+    def get_selectors(self):
+        return [AP_ARTICLES]
+
+    def get_scopes(self):
+        return AP_SCOPES
 
     def get_icon_url(self):
         return "https://apnews.com/favicon.ico"
@@ -267,6 +244,13 @@ class CNBC(RSSBase):
             ),
         ]
 
+    def get_max_concurrency(self):
+        # lots of small feeds from the same host
+        return 8
+
+    def get_hedge_requests(self):
+        return True
+
     def get_icon_url(self):
         return "https://www.cnbc.com/favicon.ico"
 
@@ -338,6 +322,14 @@ class WashingtonPost(RSSBase):
             ("Sport", "https://feeds.washingtonpost.com/rss/sports"),
         ]
 
+    def get_hedge_requests(self):
+        # one slow feed out of ten decides the response time
+        return True
+
+    def get_max_items_per_section(self):
+        # the arcio feeds run to hundreds of items, most of them days old
+        return 50
+
     def get_icon_url(self):
         return "https://www.washingtonpost.com/favicon.ico"
 
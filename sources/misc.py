@@ -22,13 +22,18 @@
 
 import traceback
 
-from lxml import html
-from lxml.html.soupparser import fromstring
+from lxml import etree, html
 
 from fetcher import read_http_page
 from logger import logger
 
-from .base import BaseSource, RSSBase
+from .base import ArticleSelector, BaseSource, HTMLBase, RSSBase
+from .extract import Scope
+
+HACKERNEWS_ITEMS = etree.XPath("//rss/channel/item")
+HACKERNEWS_TITLE = etree.XPath("title")
+HACKERNEWS_DESCRIPTION = etree.XPath("description")
+HACKERNEWS_STORIES = etree.XPath('ul/li/span[@class="storylink"]/a')
 
 
 class HackerNews(BaseSource):
@@ -43,32 +48,35 @@ class HackerNews(BaseSource):
         # Parse and break them down instead of using RSSBase
         rss_url = "http://www.daemonology.net/hn-daily/index.rss"
         result_list = []
-        try:
-            doc = html.document_fromstring(read_http_page(rss_url))
-            for item in doc.xpath("//rss/channel/item"):
+
+        def parse_feed(data):
+            result = []
+            doc = html.document_fromstring(data)
+            for item in HACKERNEWS_ITEMS(doc):
                 title = (
-                    item.xpath("title")[0].text
-                    if len(item.xpath("title")) > 0
+                    HACKERNEWS_TITLE(item)[0].text
+                    if len(HACKERNEWS_TITLE(item)) > 0
                     else "Daily Hacker News"
                 )
-                result_list.append(self.create_section(title))
+                result.append(self.create_section(title))
 
                 description = (
-                    item.xpath("description")[0]
-                    if len(item.xpath("description")) > 0
+                    HACKERNEWS_DESCRIPTION(item)[0]
+                    if len(HACKERNEWS_DESCRIPTION(item)) > 0
                     else None
                 )
                 if description is not None:
-                    for article in description.xpath(
-                        'ul/li/span[@class="storylink"]/a'
-                    ):
+                    for article in HACKERNEWS_STORIES(description):
                         if article.text and article.get("href"):
-                            result_list.append(
+                            result.append(
                                 self.create_article(
                                     article.text.strip(), article.get("href")
                                 )
                             )
+            return result
 
+        try:
+            result_list.extend(self.parse_memoized(read_http_page(rss_url), parse_feed))
         except Exception as e:
             logger.exception("Problem processing HackerNews: " + str(e))
             logger.exception(traceback.format_exception(e))
@@ -79,19 +87,26 @@ class HackerNews(BaseSource):
         return "http://www.daemonology.net/favicon.ico"
 
 
-class RFACantonese(BaseSource):
+RFA_SCOPES = [Scope("article")]
+RFA_ARTICLES = ArticleSelector(
+    '//article/div[contains(@class, "c-sm-text")]'
+    '|//article/div[contains(@class, "c-md-text")]'
+    '|//article/div/div[contains(@class, "c-xl-text")]',
+    title="h2/a",
+    abstract="p",
+)
+
+
+class RFACantonese(HTMLBase):
     def get_id(self):
         return "rfa_cantonese"
 
     def get_desc(self):
         return "RFA 粵語部"
 
-    def get_articles(self):
-        result_list = []
-        site_url = "https://www.rfa.org/"
-        base_url = site_url + "cantonese"
-
-        sections = [
+    def get_sections(self):
+        base_url = self.get_base_url() + "cantonese"
+        return [
             ("港澳台新聞", base_url + "/htm"),
             ("世界新聞", base_url + "/world"),
             ("專題", base_url + "/in-depth"),
@@ -102,40 +117,14 @@ class RFACantonese(BaseSource):
             ("影片", base_url + "/video"),
         ]
 
-        try:
-            for title, url in sections:
-                # for each section, insert a title...
-                result_list.append(self.create_section(title))
-                # ... then parse the page and extract article links
-                doc = fromstring(read_http_page(url))
-                for topic in doc.xpath(
-                    '//article/div[contains(@class, "c-sm-text")]'
-                    '|//article/div[contains(@class, "c-md-text")]'
-                    '|//article/div/div[contains(@class, "c-xl-text")]'
-                ):
-                    title = topic.xpath("h2/a")
-                    intro = topic.xpath("p")
-
-                    if title:
-                        title_text = title[0].text
-
-                        result_list.append(
-                            self.create_article(
-                                title_text.strip(),
-                                site_url + title[0].get("href"),
-                                (
-                                    intro[0].text.strip()
-                                    if intro and intro[0].text
-                                    else None
-                                ),
-                            )
-                        )
+    def get_selectors(self):
+        return [RFA_ARTICLES]
 
-        except Exception as e:
-            logger.exception("Problem processing RFACantonese: " + str(e))
-            logger.exception(traceback.format_exception(e))
+    def get_base_url(self):
+        return "https://www.rfa.org/"
 
-        return result_list
+    def get_scopes(self):
+        return RFA_SCOPES
 
     def get_icon_url(self):
         return "https://www.rfa.org/favicon.ico"
@@ -23,12 +23,13 @@
 import json
 import traceback
 
-from lxml import html
+from lxml import etree, html
 
-from fetcher import read_http_page
+from fetcher import read_http_page, report_failure
 from logger import logger
 
-from .base import BaseSource, RDFBase, RSSBase
+from .base import ArticleSelector, BaseSource, HTMLBase, RDFBase, RSSBase
+from .extract import Scope
 
 
 class LibertyTimes(BaseSource):
@@ -108,19 +109,30 @@ class UnitedDailyNewsRSS(RSSBase):
         return "https://udn.com/favicon.ico"
 
 
-class MoneyUnitedDailyNewsRSS(RSSBase):
+MONEYUDN_SCOPES = [Scope("section", "class", "cate-main__section")]
+# main stories first...
+MONEYUDN_HEADLINES = ArticleSelector(
+    '//section[contains(@class, "cate-main__section")]/div[contains(@class, "story-headline-wrapper")]',
+    title='div[contains(@class, "story__content")]/a/h3',
+    link='div[contains(@class, "story__content")]/a',
+    abstract='div[contains(@class, "story__content")]/a/p',
+)
+# ... then other stories
+MONEYUDN_STORIES = ArticleSelector(
+    '//section[contains(@class, "cate-main__section")]/ul[contains(@class, "story-flex-bt-wrapper")]/li[contains(@class, "story__item")]/a'
+)
+
+
+class MoneyUnitedDailyNewsRSS(HTMLBase):
     def get_id(self):
         return "money-udn"
 
     def get_desc(self):
         return "經濟日報-聯合新聞網"
 
-    def get_articles(self):
-        site_base_url = "https://money.udn.com"
-        base_url = site_base_url + "/money/cate/"
-
-        result_list = []
-        sections = [
+    def get_sections(self):
+        base_url = self.get_base_url() + "/money/cate/"
+        return [
             ("要聞", base_url + "10846"),
             ("國際", base_url + "5588"),
             ("兩岸", base_url + "5589"),
@@ -134,55 +146,14 @@ class MoneyUnitedDailyNewsRSS(RSSBase):
             ("商情", base_url + "5597"),
         ]
 
-        try:
-            for title, url in sections:
-                # for each section, insert a title...
-                result_list.append(self.create_section(title))
-                # ... then parse the page and extract article links
-                doc = html.document_fromstring(read_http_page(url))
-                for topic in doc.xpath(
-                    '//section[contains(@class, "cate-main__section")]/div[contains(@class, "story-headline-wrapper")]'
-                ):
-                    # main stories first...
-                    link = topic.xpath('div[contains(@class, "story__content")]/a')
-                    title = topic.xpath('div[contains(@class, "story__content")]/a/h3')
-                    intro = topic.xpath('div[contains(@class, "story__content")]/a/p')
-                    title_text = title[0].text if title else None
-
-                    if title and title_text and link:
-                        result_list.append(
-                            self.create_article(
-                                title_text.strip(),
-                                site_base_url + link[0].get("href"),
-                                (
-                                    intro[0].text.strip()
-                                    if intro and intro[0].text
-                                    else None
-                                ),
-                            )
-                        )
-
-                for topic in doc.xpath(
-                    '//section[contains(@class, "cate-main__section")]/ul[contains(@class, "story-flex-bt-wrapper")]'
-                ):
-                    # ... then other stories
-                    titles = topic.xpath('li[contains(@class, "story__item")]/a')
-                    for title in titles:
-                        title_text = title.text
-                        if title_text:
-                            result_list.append(
-                                self.create_article(
-                                    title_text.strip(),
-                                    site_base_url + title.get("href"),
-                                    None,
-                                )
-                            )
+    def get_selectors(self):
+        return [MONEYUDN_HEADLINES, MONEYUDN_STORIES]
 
-        except Exception as e:
-            logger.exception("Problem processing MoneyUnitedDailyNewsRSS: " + str(e))
-            logger.exception(traceback.format_exception(e))
+    def get_base_url(self):
+        return "https://money.udn.com"
 
-        return result_list
+    def get_scopes(self):
+        return MONEYUDN_SCOPES
 
     def get_icon_url(self):
         return "https://money.udn.com/favicon.ico"
@@ -204,6 +175,11 @@ class TaipeiTimes(RDFBase):
         return "data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAABwAAAAcCAMAAABF0y+mAAAAk1BMVEX////8/Pzq6ury8vLv7+/4+Pj19fXZ2dnDwsKnpqaGhIXNzMzHxsazsrNBPj+ioaF2dHVIRUZsaWplY2SFhIWTkpK5uLmcm5zj4+PEw8OPjo6trKxaV1hfXV3w3N3dt7jp0tLNlJXOjI6jHB+sNDfGenu1bW6/cXOnOTqwQUS6dnenKS20UFK0WlrCbW/ft7jNm5ySIOF/AAAA/klEQVR4AbWRA6JFIRQA51x06lXPtq39b+7b5uQmx/8hSZpmuQhixKQpV+mqxi1qXcGHEEmLuJIrlW00lZR7vANXhRo2UG9kUOWpNM1W+0p2XFO7rRJVeSpj7HVvZ1LI5JksUYC+DLBNqCe51Hig09Me2NjIbYSSc0kj4xsMR1eM35GT6Wy+WL4jp6v1ZrV9b+Z6N9+/K8eH4/C9ZU+H1epw5htkzRCs+lxSyCT1HcVH4Za2CSXRAe0GdBMGolbb5tmXldG+SF+pQqjDC2mj9S4wiJFeX17IUl5vao8qQIwPstmACnUKPilTaQebRH2QSZtUM01zRI16TW2b/+MSqy0PJ4pdskwAAAAASUVORK5CYII="
 
 
+CHINATIMES_TOPICS = etree.XPath(
+    '//section[contains(@class, "article-list")]/ul//li//h3[contains(@class, "title")]//a'
+)
+
+
 class ChinaTimes(BaseSource):
     def get_id(self):
         return "chinatimes"
@@ -233,19 +209,25 @@ class ChinaTimes(BaseSource):
             ("新聞專輯", base_url + "/album/?chdtv"),
         ]
 
+        def parse_section(data):
+            doc = html.document_fromstring(data)
+            return [
+                self.create_article(topic.text.strip(), topic.get("href"))
+                for topic in CHINATIMES_TOPICS(doc)
+                if topic.text and topic.get("href")
+            ]
+
         try:
             for title, url in sections:
                 # for each section, insert a title...
                 result_list.append(self.create_section(title))
                 # ... then parse the page and extract article links
-                doc = html.document_fromstring(read_http_page(url))
-                for topic in doc.xpath(
-                    '//section[contains(@class, "article-list")]/ul//li//h3[contains(@class, "title")]//a'
-                ):
-                    if topic.text and topic.get("href"):
-                        result_list.append(
-                            self.create_article(topic.text.strip(), topic.get("href"))
-                        )
+                articles = self.parse_memoized(read_http_page(url), parse_section)
+                result_list.extend(articles)
+                if not articles:
+                    # the site serves a page without the article list when it
+                    # blocks us. Count it so that the remaining sections fail fast
+                    report_failure(url)
 
         except Exception as e:
             logger.exception("Problem processing ChinaTimes: " + str(e))
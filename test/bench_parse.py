@@ -0,0 +1,140 @@
+# Copyright (c) 2016 Clarence Ho (clarenceho at gmail dot com)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+"""Micro-benchmark of section parsing: per item cost of string XPaths and a new
+parser per page against the parsers of the sources.
+
+Usage: python test/bench_parse.py [items per page] [repeats]
+"""
+
+import html as html_lib
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from lxml import etree, html  # noqa: E402
+
+from sources import hk  # noqa: E402
+
+
+def make_rss(items):
+    entries = "".join(
+        f"<item><title> Title {i} </title><link>https://example.com/{i}</link>"
+        f"<description>Abstract &amp;amp; {i}</description></item>"
+        for i in range(items)
+    )
+    return f"<rss><channel><title>Feed</title>{entries}</channel></rss>".encode()
+
+
+def make_html(items):
+    topics = "".join(
+        '<div class="content"><ul class="txt">'
+        f'<li class="title"><a href="https://example.com/{i}">Title {i}</a></li>'
+        f'<li class="intro"><a href="https://example.com/{i}">Intro {i}</a></li>'
+        "</ul></div>"
+        for i in range(items)
+    )
+    return (
+        "<html><body><div class='nav'>" + "<a href='#'>x</a>" * 200 + "</div>"
+        f'<div class="list_tuwen">{topics}</div></body></html>'
+    ).encode()
+
+
+def rss_strings(data):
+    result = []
+    doc = etree.fromstring(data, parser=etree.XMLParser(recover=True))
+    for entry in doc.xpath("//rss/channel/item"):
+        title = entry.xpath("title")[0].text
+        link = entry.xpath("link")[0].text
+        abstract = html_lib.unescape(entry.xpath("description")[0].text)
+        result.append({"title": title.strip(), "url": link, "abstract": abstract})
+    return result
+
+
+def html_strings(data):
+    result = []
+    doc = html.document_fromstring(data)
+    for topic in doc.xpath(
+        '//div[contains(@class, "list_tuwen")]/div[contains(@class, "content")]'
+    ):
+        title = topic.xpath(
+            'ul[contains(@class, "txt")]/li[contains(@class, "title")]/a'
+        )
+        intro = topic.xpath(
+            'ul[contains(@class, "txt")]/li[contains(@class, "intro")]/a'
+        )
+        if title and title[0].text and title[0].get("href"):
+            result.append(
+                {
+                    "title": title[0].text.strip(),
+                    "url": title[0].get("href"),
+                    "abstract": intro[0].text.strip() if intro else None,
+                }
+            )
+    return result
+
+
+def html_compiled(data):
+    result = []
+    doc = html.document_fromstring(data)
+    selector = hk.TAKUNGPAO_ARTICLES
+    for topic in selector.items(doc):
+        title = selector.title(topic)
+        intro = selector.abstract(topic)
+        if title and title[0].text and title[0].get("href"):
+            result.append(
+                {
+                    "title": title[0].text.strip(),
+                    "url": title[0].get("href"),
+                    "abstract": intro[0].text.strip() if intro else None,
+                }
+            )
+    return result
+
+
+def bench(name, fn, data, items, repeats):
+    best = min(timeit.repeat(lambda: fn(data), number=repeats, repeat=5))
+    per_item = best / repeats / items * 1e6
+    print(f"{name:<28} {per_item:8.2f} us/item")
+    return per_item
+
+
+def main():
+    items = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    repeats = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+
+    rss = make_rss(items)
+    source = hk.HeadlineDaily()
+    assert rss_strings(rss) == source.parse_feed(rss)
+    before = bench("rss: strings, new parser", rss_strings, rss, items, repeats)
+    after = bench("rss: parse_feed", source.parse_feed, rss, items, repeats)
+    print(f"{'':<28} {before / after:8.2f}x")
+
+    page = make_html(items)
+    assert html_strings(page) == html_compiled(page)
+    before = bench("html: strings", html_strings, page, items, repeats)
+    after = bench("html: compiled", html_compiled, page, items, repeats)
+    print(f"{'':<28} {before / after:8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
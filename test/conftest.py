@@ -0,0 +1,151 @@
+import os
+import sys
+import time
+
+import pytest
+
+# the modules under test live at the root of the repository
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from cache import DEFAULT_TTL  # noqa: E402
+from sources.base import MAX_CONCURRENCY, BaseSource, RSSBase  # noqa: E402
+
+
+def pytest_configure(config):
+    config.addinivalue_line(
+        "markers", "clock(*modules): modules whose time.monotonic the clock replaces"
+    )
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(request, monkeypatch):
+    """A FakeClock standing in for time.monotonic of the modules given with the
+    clock marker, e.g. pytestmark = pytest.mark.clock(cache)"""
+    clock = FakeClock()
+    marker = request.node.get_closest_marker("clock")
+    for module in marker.args if marker else ():
+        monkeypatch.setattr(module.time, "monotonic", clock)
+    return clock
+
+
+class FakeSource(BaseSource):
+    """A source answering get_articles with copies of articles after delay seconds"""
+
+    def __init__(
+        self,
+        articles=(),
+        source_id="test_source",
+        delay=0,
+        max_concurrency=MAX_CONCURRENCY,
+    ):
+        self.articles = articles
+        self.source_id = source_id
+        self.delay = delay
+        self.max_concurrency = max_concurrency
+
+    def get_id(self):
+        return self.source_id
+
+    def get_desc(self):
+        return "test"
+
+    def get_icon_url(self):
+        return None
+
+    def get_max_concurrency(self):
+        return self.max_concurrency
+
+    def get_articles(self):
+        time.sleep(self.delay)
+        # results are marked pending in place
+        return [dict(article) for article in self.articles]
+
+
+class FakeFeeds(RSSBase):
+    """A RSS source of the feeds links, [(title, url)]"""
+
+    def __init__(
+        self,
+        links=(),
+        source_id="test_feeds",
+        ttl=DEFAULT_TTL,
+        section_ttl=None,
+        max_items=None,
+    ):
+        self.links = list(links)
+        self.source_id = source_id
+        self.ttl = ttl
+        self.section_ttl = section_ttl
+        self.max_items = max_items
+
+    def get_id(self):
+        return self.source_id
+
+    def get_desc(self):
+        return "test"
+
+    def get_icon_url(self):
+        return None
+
+    def get_cache_ttl(self):
+        return self.ttl
+
+    def get_section_ttl(self, title, url):
+        return self.section_ttl or self.ttl
+
+    def get_max_items_per_section(self):
+        return self.max_items
+
+    def get_rss_links(self):
+        return self.links
+
+
+@pytest.fixture
+def make_source():
+    return FakeSource
+
+
+@pytest.fixture
+def make_feeds():
+    return FakeFeeds
+
+
+@pytest.fixture
+def serve(monkeypatch):
+    """serve(source) has the app answer for source and returns get(query, headers),
+    which requests it and returns the response, read whole.
+
+    The route is called directly, as the app can't get new routes once it served a
+    request. Whatever got cached for the source is dropped afterwards.
+    """
+    import main
+
+    served = []
+    monkeypatch.setattr(main.refresher, "start", lambda: None)
+
+    def _serve(source):
+        monkeypatch.setitem(main.allSources, source.get_id(), source)
+        served.append(source.get_id())
+
+        def get(query="", headers=None):
+            path = "/" + source.get_id() + query
+            with main.app.test_request_context(path, headers=headers):
+                response = main.app.process_response(main.route_source())
+                response.direct_passthrough = False
+                # read streams while the request context is there
+                response.get_data()
+                return response
+
+        return get
+
+    yield _serve
+    for source_id in served:
+        main.article_cache.invalidate(source_id)
@@ -0,0 +1,150 @@
+import http.server
+import threading
+import time
+
+import pytest
+
+import fetcher
+from deadline import deadline_after
+from fetcher import CircuitBreaker
+
+pytestmark = pytest.mark.clock(fetcher)
+
+
+@pytest.fixture
+def breaker(clock):
+    return CircuitBreaker(threshold=2, cool_down=10, probe_lease=30)
+
+
+def open_circuit(breaker, host="h"):
+    for _ in range(breaker.threshold):
+        breaker.record_failure(host)
+
+
+def test_opens_after_threshold(breaker):
+    breaker.record_failure("h")
+    assert breaker.get_state("h") == CircuitBreaker.CLOSED
+    assert breaker.allow("h")
+    breaker.record_failure("h")
+    assert breaker.get_state("h") == CircuitBreaker.OPEN
+    assert not breaker.allow("h")
+
+
+def test_success_resets_failures(breaker):
+    breaker.record_failure("h")
+    breaker.record_success("h")
+    breaker.record_failure("h")
+    assert breaker.get_state("h") == CircuitBreaker.CLOSED
+
+
+def test_single_probe_after_cool_down(breaker, clock):
+    open_circuit(breaker)
+    clock.now += 10
+    allowed, probe = breaker.admit("h")
+    assert allowed and probe is not None
+    assert breaker.get_state("h") == CircuitBreaker.HALF_OPEN
+    assert breaker.admit("h") == (False, None)
+
+
+def test_probe_success_closes(breaker, clock):
+    open_circuit(breaker)
+    clock.now += 10
+    _, probe = breaker.admit("h")
+    breaker.record_success("h")
+    breaker.release("h", probe)
+    assert breaker.get_state("h") == CircuitBreaker.CLOSED
+    assert breaker.allow("h")
+
+
+def test_probe_failure_reopens(breaker, clock):
+    open_circuit(breaker)
+    clock.now += 10
+    _, probe = breaker.admit("h")
+    breaker.record_failure("h")
+    breaker.release("h", probe)
+    assert breaker.get_state("h") == CircuitBreaker.OPEN
+    assert not breaker.allow("h")
+    clock.now += 10
+    assert breaker.allow("h")
+
+
+def test_released_probe_lets_next_request_probe(breaker, clock):
+    open_circuit(breaker)
+    clock.now += 10
+    _, probe = breaker.admit("h")
+    breaker.release("h", probe)
+    assert breaker.get_state("h") == CircuitBreaker.OPEN
+    allowed, next_probe = breaker.admit("h")
+    assert allowed and next_probe != probe
+
+
+def test_stale_release_keeps_current_probe(breaker, clock):
+    open_circuit(breaker)
+    clock.now += 10
+    _, first = breaker.admit("h")
+    clock.now += 30
+    _, second = breaker.admit("h")
+    breaker.release("h", first)
+    assert breaker.get_state("h") == CircuitBreaker.HALF_OPEN
+    assert not breaker.allow("h")
+    breaker.release("h", second)
+    assert breaker.allow("h")
+
+
+def test_probe_lease_expires(breaker, clock):
+    open_circuit(breaker)
+    clock.now += 10
+    assert breaker.allow("h")
+    clock.now += 29
+    assert not breaker.allow("h")
+    clock.now += 1
+    assert breaker.allow("h")
+
+
+def test_release_without_probe_is_noop(breaker):
+    breaker.release("h", None)
+    assert breaker.get_state("h") == CircuitBreaker.CLOSED
+
+
+class SlowHandler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == "/slow":
+            time.sleep(1)
+        body = b"x" * 1024
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def slow_host():
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), SlowHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"127.0.0.1:{server.server_port}"
+    server.shutdown()
+
+
+def test_probe_cut_by_deadline_is_released(slow_host, monkeypatch):
+    breaker = CircuitBreaker(threshold=1, cool_down=0)
+    monkeypatch.setattr(fetcher, "_breaker", breaker)
+    breaker.record_failure(slow_host)
+
+    with deadline_after(0.2):
+        assert fetcher.read_http_page(f"http://{slow_host}/slow") is None
+    assert breaker.get_state(slow_host) == CircuitBreaker.OPEN
+    assert breaker.allow(slow_host)
+
+
+def test_probe_aborted_for_size_is_released(slow_host, monkeypatch):
+    breaker = CircuitBreaker(threshold=1, cool_down=0)
+    monkeypatch.setattr(fetcher, "_breaker", breaker)
+    breaker.record_failure(slow_host)
+
+    assert fetcher.read_http_page(f"http://{slow_host}/big", max_size=10) is None
+    assert breaker.get_state(slow_host) == CircuitBreaker.OPEN
+    assert breaker.allow(slow_host)
@@ -0,0 +1,54 @@
+import fetcher
+from cassette import CassetteStore
+
+URL = "https://example.com/news"
+
+
+def test_round_trip(tmp_path):
+    store = CassetteStore(str(tmp_path))
+    store.save("POST", URL, "page=2", {"X-A": "1"}, {"c": "v"}, b"page", 0.5)
+    assert store.load("POST", URL, "page=2", {"X-A": "1"}, {"c": "v"}) == (
+        True,
+        b"page",
+        0.5,
+    )
+    assert store.load("POST", URL, "page=3", {"X-A": "1"}, {"c": "v"})[0] is False
+
+
+def test_failed_fetch_is_recorded(tmp_path):
+    store = CassetteStore(str(tmp_path))
+    store.save("GET", URL, None, None, None, None, 1.0)
+    assert store.load("GET", URL, None, None, None) == (True, None, 1.0)
+
+
+def test_cookies_and_headers_are_part_of_the_key(tmp_path):
+    store = CassetteStore(str(tmp_path))
+    store.save("GET", URL, None, None, {"edition": "vancouver"}, b"vancouver", 0)
+    store.save("GET", URL, None, None, {"edition": "toronto"}, b"toronto", 0)
+    store.save("GET", URL, None, {"Accept-Language": "en"}, None, b"en", 0)
+    assert store.load("GET", URL, None, None, {"edition": "toronto"})[1] == b"toronto"
+    assert store.load("GET", URL, None, None, {"edition": "vancouver"})[1] == (
+        b"vancouver"
+    )
+    assert store.load("GET", URL, None, {"Accept-Language": "en"}, None)[1] == b"en"
+    assert store.load("GET", URL, None, None, None)[0] is False
+
+
+def test_key_ignores_order(tmp_path):
+    store = CassetteStore(str(tmp_path))
+    store.save("GET", URL, None, {"A": "1", "B": "2"}, {"x": "1", "y": "2"}, b"ok", 0)
+    recorded = store.load("GET", URL, None, {"B": "2", "A": "1"}, {"y": "2", "x": "1"})
+    assert recorded[1] == b"ok"
+
+
+def test_replay_tells_cookies_apart(tmp_path, monkeypatch):
+    store = CassetteStore(str(tmp_path))
+    store.save("GET", URL, None, None, {"edition": "vancouver"}, b"vancouver", 0)
+    store.save("GET", URL, None, None, {"edition": "toronto"}, b"toronto", 0)
+    monkeypatch.setattr(fetcher, "_cassettes", store)
+    monkeypatch.setattr(fetcher, "FETCH_MODE", "replay")
+    monkeypatch.setattr(fetcher, "REPLAY_LATENCY", "0")
+    assert fetcher.read_http_page(URL, cookies={"edition": "toronto"}) == b"toronto"
+    assert fetcher.read_http_page(URL, cookies={"edition": "vancouver"}) == (
+        b"vancouver"
+    )
@@ -0,0 +1,115 @@
+import http.server
+import threading
+import time
+
+import pytest
+
+import fetcher
+from bulkhead import Bulkhead
+from sources import base
+
+
+def test_results_in_input_order(make_source):
+    def slow_first(item):
+        time.sleep(0.05 if item == 0 else 0)
+        return item * 2
+
+    assert make_source().map_concurrently(slow_first, range(10)) == list(
+        range(0, 20, 2)
+    )
+
+
+def test_at_most_max_concurrency_items_run(make_source):
+    lock = threading.Lock()
+    running = [0, 0]
+
+    def track(item):
+        with lock:
+            running[0] += 1
+            running[1] = max(running[1], running[0])
+        time.sleep(0.02)
+        with lock:
+            running[0] -= 1
+
+    make_source(max_concurrency=3).map_concurrently(track, range(12))
+    assert running[1] == 3
+
+
+def test_nested_calls_dont_deadlock(make_source):
+    source = make_source(max_concurrency=6)
+
+    def outer(item):
+        return sum(source.map_concurrently(lambda page: page, range(6)))
+
+    assert source.map_concurrently(outer, range(40)) == [15] * 40
+
+
+def test_errors_are_raised_in_order(make_source):
+    def fail_on_two(item):
+        if item == 2:
+            raise ValueError(item)
+        return item
+
+    results = make_source().iter_concurrently(fail_on_two, range(5))
+    assert next(results) == 0
+    assert next(results) == 1
+    with pytest.raises(ValueError):
+        next(results)
+
+
+def test_slow_bulkhead_keeps_to_its_page_pool(monkeypatch, make_source):
+    monkeypatch.setattr(base, "POOL_WORKERS", 2)
+    monkeypatch.setattr(base, "_pools", {})
+    bulkhead = Bulkhead(max_workers=4)
+    release = threading.Event()
+    source = make_source(max_concurrency=6)
+
+    def slow_scrape():
+        return source.map_concurrently(lambda page: release.wait(5), range(6))
+
+    # enough slow scrapes to take every page thread there would be in one pool
+    slow = [bulkhead.submit("slow", slow_scrape) for _ in range(3)]
+    time.sleep(0.05)
+    start = time.monotonic()
+    fast = bulkhead.submit("fast", lambda: source.map_concurrently(str, range(6)))
+    assert fast.result(timeout=2) == [str(page) for page in range(6)]
+    assert time.monotonic() - start < 1
+    release.set()
+    for scrape in slow:
+        scrape.result()
+
+
+FEED = b"<rss><channel><item><title>A</title><link>https://x/a</link></item></channel></rss>"
+
+
+class KeepAliveHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(FEED)))
+        self.end_headers()
+        self.wfile.write(FEED)
+
+    def log_message(self, *args):
+        pass
+
+
+def test_scrapes_reuse_connections(make_feeds):
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), KeepAliveHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host = f"127.0.0.1:{server.server_port}"
+
+    # sections are read again on every scrape
+    feeds = make_feeds([(str(i), f"http://{host}/{i}") for i in range(6)], ttl=0)
+    try:
+        for _ in range(3):
+            feeds.get_articles()
+        stats = fetcher.get_connection_stats()[host]
+        assert stats["requests"] == 18
+        # threads (and their connections) outlive a scrape. Which thread picks an
+        # item varies, so a few connections may still be opened later on
+        assert stats["reused"] >= 9
+    finally:
+        server.shutdown()
@@ -0,0 +1,116 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import main
+from deadline import (
+    DeadlineExceeded,
+    bind_context,
+    deadline_after,
+    get_remaining,
+    is_expired,
+    limit_timeout,
+)
+from sources.base import is_complete, mark_pending
+
+
+def test_no_deadline():
+    assert get_remaining() is None
+    assert not is_expired()
+    assert limit_timeout(5) == 5
+
+
+def test_nested_deadline_keeps_the_sooner_one():
+    with deadline_after(1):
+        with deadline_after(10):
+            assert get_remaining() <= 1
+        with deadline_after(0.5):
+            assert get_remaining() <= 0.5
+    assert get_remaining() is None
+
+
+def test_limit_timeout():
+    with deadline_after(1):
+        assert limit_timeout(10) <= 1
+        assert limit_timeout(0.1) == 0.1
+    with deadline_after(0):
+        with pytest.raises(DeadlineExceeded):
+            limit_timeout(10)
+
+
+def test_bind_context_carries_deadline_into_threads():
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        with deadline_after(1):
+            bound = executor.submit(bind_context(get_remaining)).result()
+        unbound = executor.submit(get_remaining).result()
+    assert bound is not None and bound <= 1
+    assert unbound is None
+
+
+def test_mark_pending_marks_empty_sections():
+    articles = [
+        {"title": "a"},
+        {"title": "x", "url": "u"},
+        {"title": "b"},
+        {"title": "c"},
+    ]
+    mark_pending(articles)
+    assert [item.get("pending", False) for item in articles] == [
+        False,
+        False,
+        True,
+        True,
+    ]
+    assert not is_complete(articles)
+
+
+@pytest.fixture
+def get(monkeypatch, make_source, serve):
+    monkeypatch.setattr(main, "REQUEST_DEADLINE", 0.1)
+    # like a hand-written scraper whose fetches were cut by the deadline
+    source = make_source(
+        [{"title": "fast"}, {"title": "a", "url": "u"}, {"title": "slow"}],
+        source_id="test_slow_hand_written",
+        delay=0.3,
+    )
+    return serve(source)
+
+
+@pytest.mark.parametrize("query", ["", "?stream=1"])
+def test_hand_written_result_after_deadline_is_not_cached(get, query):
+    response = get(query)
+    assert response.status_code == 200
+    # the stream is consumed before checking the cache
+    assert b"slow" in response.data
+    value, _ = main.article_cache.peek("test_slow_hand_written")
+    assert value is None
+
+
+def test_hand_written_result_after_deadline_is_not_cached_by_clients(get):
+    response = get()
+    assert response.json[-1] == {"title": "slow", "pending": True}
+    assert "no-cache" in response.headers["Cache-Control"]
+
+
+@pytest.mark.parametrize("query", ["", "?stream=1"])
+def test_request_does_not_wait_past_deadline_for_a_refresh(get, query):
+    release = threading.Event()
+
+    def slow_refresh():
+        release.wait(5)
+        return [{"title": "a", "url": "u"}]
+
+    with ThreadPoolExecutor(1) as executor:
+        refresh = executor.submit(
+            main.article_cache.refresh, "test_slow_hand_written", slow_refresh
+        )
+        time.sleep(0.05)
+        start = time.monotonic()
+        response = get(query)
+        elapsed = time.monotonic() - start
+        release.set()
+        refresh.result()
+    assert response.status_code == 503
+    assert elapsed < 0.5
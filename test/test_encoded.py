@@ -0,0 +1,107 @@
+import gzip
+import json
+
+import brotli
+import pytest
+
+import main
+from cache import ArticleCache
+from encoded import EncodedBodies
+
+ARTICLES = [{"title": "News"}, {"title": "A", "url": "https://x/a"}]
+
+
+@pytest.fixture
+def get(make_source, serve):
+    # cut by the deadline, so never cached
+    source = make_source(
+        [
+            {"title": "News"},
+            {"title": "A", "url": "https://x/a"},
+            {"title": "B", "pending": True},
+        ],
+        source_id="test_encoded",
+    )
+    return serve(source)
+
+
+def test_bodies_are_encoded_when_cached(get):
+    before = main.encoded_bodies.get_stats()["encodes"]
+    main.article_cache.put("test_encoded", list(ARTICLES))
+    assert main.encoded_bodies.get_stats()["encodes"] == before + 1
+    get()
+    get("?stream=1")
+    assert main.encoded_bodies.get_stats()["encodes"] == before + 1
+
+
+@pytest.mark.parametrize("query", ["", "?stream=1"])
+def test_cached_result_is_compressed_with_etag(get, query):
+    main.article_cache.put("test_encoded", list(ARTICLES))
+    plain = get(query)
+    assert plain.get_etag()[1] is False
+    br = get(query, {"Accept-Encoding": "br"})
+    assert br.content_encoding == "br"
+    assert brotli.decompress(br.get_data()) == plain.get_data()
+    gz = get(query, {"Accept-Encoding": "gzip"})
+    assert gz.content_encoding == "gzip"
+    assert gzip.decompress(gz.get_data()) == plain.get_data()
+    assert len({plain.get_etag(), br.get_etag(), gz.get_etag()}) == 3
+    assert "Accept-Encoding" in plain.vary
+    not_modified = get(query, {"If-None-Match": f'"{plain.get_etag()[0]}"'})
+    assert not_modified.status_code == 304
+    # the client has the identity body, not the brotli one it now asks for
+    switched = get(
+        query,
+        {"If-None-Match": f'"{plain.get_etag()[0]}"', "Accept-Encoding": "br"},
+    )
+    assert switched.status_code == 200
+    assert switched.get_data() == br.get_data()
+
+
+def test_ndjson_form(get):
+    main.article_cache.put("test_encoded", list(ARTICLES))
+    stream = get("?stream=1")
+    assert stream.mimetype == main.NDJSON_MIMETYPE
+    lines = stream.get_data(as_text=True).splitlines()
+    assert [json.loads(line) for line in lines] == ARTICLES
+    # the forms are representations of their own
+    assert stream.get_etag() != get().get_etag()
+
+
+@pytest.mark.parametrize("query", ["", "?stream=1"])
+def test_uncached_result_is_not_encoded(get, query):
+    before = main.encoded_bodies.get_stats()["encodes"]
+    response = get(query, {"Accept-Encoding": "br"})
+    assert response.status_code == 200
+    assert response.content_encoding is None
+    assert response.get_etag() == (None, None)
+    assert response.cache_control.no_cache
+    assert main.encoded_bodies.get_stats()["encodes"] == before
+
+
+def test_bodies_go_with_their_cache_entry():
+    bodies = EncodedBodies({"json": lambda value: json.dumps(value).encode()})
+    cache = ArticleCache(max_bytes=3000, on_put=bodies.put, on_evict=bodies.drop)
+    values = {key: [{"title": key * 1200}] for key in "abc"}
+    for key, value in values.items():
+        cache.put(key, value)
+    assert cache.peek("a")[0] is None
+    assert bodies.get("a", values["a"], "json") is None
+    assert bodies.get("b", values["b"], "json") is not None
+    cache.invalidate("b")
+    assert bodies.get("b", values["b"], "json") is None
+    # a replaced value leaves the bodies of the new one
+    newer = [{"title": "c"}]
+    cache.put("c", newer)
+    assert bodies.get("c", newer, "json") is not None
+    assert bodies.get_stats()["bodies"] == 1
+
+
+@pytest.mark.parametrize("query", ["", "?stream=1"])
+def test_empty_result_is_not_cached(make_source, serve, query):
+    # e.g. every circuit open: the sections come back without articles
+    get = serve(make_source([{"title": "News"}, {"title": "World"}], "test_encoded"))
+    response = get(query)
+    assert response.status_code == 200
+    assert response.cache_control.no_cache
+    assert main.article_cache.peek("test_encoded")[0] is None
@@ -0,0 +1,181 @@
+import pytest
+from lxml import etree
+from lxml import html as lxml_html
+
+from sources import base
+from sources.extract import FEED_CHUNK_SIZE, Scope, extract_html
+from sources.hk import HKEJ, ORIENTALDAILY_ARTICLES, ORIENTALDAILY_SCOPES, TaKungPao
+from sources.intl import AP
+from sources.misc import RFACantonese
+from sources.taiwan import MoneyUnitedDailyNewsRSS
+
+# filler longer than a feed chunk around the content, with multi-byte characters
+# and elements that look like scopes without matching them
+FILLER = (
+    '<div class="nav"><p>港聞 國際 財經 &amp; 體育</p><!-- <div class="list_tuwen"> -->'
+    "<script>var s = '<article>';</script></div>\n"
+) * (FEED_CHUNK_SIZE // 60)
+
+TAKUNGPAO = """
+<div class="list_tuwen">
+  <div class="content"><ul class="txt">
+    <li class="title"><a href="http://www.takungpao.com.hk/1.html"> 頭條新聞 </a></li>
+    <li class="intro"><a>簡介 &lt;一&gt;</a></li>
+  </ul></div>
+  <div class="content"><ul class="txt">
+    <li class="title"><a href="http://www.takungpao.com.hk/2.html">第二條</a></li>
+  </ul></div>
+</div>
+<div class="list_tuwen other"><div class="content"><ul class="txt">
+  <li class="title"><a href="http://www.takungpao.com.hk/3.html">第三條</a></li>
+</ul></div></div>
+"""
+
+HKEJ_PAGE = """
+<div class="more-articles-dd-wrapper"><form><select>
+  <option value="">請選擇</option>
+  <option value="/article/1">信報一</option>
+  <option value="/article/2">信報二</option>
+</select></form></div>
+"""
+
+AP_PAGE = """
+<h1 class="PagePromo-title"><a class="Link" href="https://apnews.com/1">
+  <span class="PagePromoContentIcons-text">Top story</span></a></h1>
+<div><h3 class="PagePromo-title"><a class="Link" href="https://apnews.com/2">
+  <span class="PagePromoContentIcons-text">Second</span></a></h3></div>
+<h2 class="Other"><a class="Link" href="https://apnews.com/3"><span>Not one</span></a></h2>
+"""
+
+RFA_PAGE = """
+<article><div class="c-sm-text"><h2><a href="cantonese/1">自由亞洲一</a></h2>
+  <p>摘要一</p></div></article>
+<article><div><div class="c-xl-text"><h2><a href="cantonese/2">自由亞洲二</a></h2>
+  </div></div></article>
+<article><div class="c-md-text"><h2><a href="cantonese/3">自由亞洲三</a></h2>
+  <p>摘要 &amp; 三</p></div><article><div class="c-sm-text"><h2>
+  <a href="cantonese/4">內嵌</a></h2></div></article></article>
+"""
+
+MONEYUDN_PAGE = """
+<section class="cate-main__section">
+  <div class="story-headline-wrapper"><div class="story__content">
+    <a href="https://money.udn.com/1"><h3>經濟頭條</h3><p>摘要</p></a>
+  </div></div>
+  <ul class="story-flex-bt-wrapper">
+    <li class="story__item"><a href="https://money.udn.com/2">股市</a></li>
+    <li class="story__item"><a href="https://money.udn.com/3">匯市</a></li>
+  </ul>
+</section>
+"""
+
+ORIENTALDAILY_PAGE = """
+<div class="sectionList"><div class="subsection"><ul class="items">
+  <li articleid="1"><a href="/1"><div class="text">東方一</div></a></li>
+  <li><a href="/x"><div class="text">no id</div></a></li>
+  <li articleid="2"><a href="/2"><div class="text">東方二</div></a></li>
+</ul></div></div>
+"""
+
+SOURCES = [
+    (TaKungPao, TAKUNGPAO),
+    (HKEJ, HKEJ_PAGE),
+    (AP, AP_PAGE),
+    (RFACantonese, RFA_PAGE),
+    (MoneyUnitedDailyNewsRSS, MONEYUDN_PAGE),
+]
+
+CHARSETS = [
+    ("utf-8", '<meta charset="utf-8">'),
+    ("big5", '<meta charset="big5">'),
+    (
+        "big5",
+        '<meta http-equiv="Content-Type" content="text/html; charset=big5">',
+    ),
+]
+
+
+def make_page(content, encoding, meta):
+    page = (
+        f"<!DOCTYPE html><html><head>{meta}<title>新聞</title></head><body>"
+        f"{FILLER}{content}{FILLER}</body></html>"
+    )
+    return page.encode(encoding)
+
+
+def full_dom(data):
+    return lxml_html.document_fromstring(data)
+
+
+def serialize(nodes):
+    # tails are text after the node, outside of any scope
+    return [etree.tostring(node, encoding="unicode", with_tail=False) for node in nodes]
+
+
+@pytest.mark.parametrize("encoding,meta", CHARSETS)
+@pytest.mark.parametrize("source_class,content", SOURCES)
+def test_articles_same_as_from_full_dom(source_class, content, encoding, meta):
+    data = make_page(content, encoding, meta)
+    assert len(data) > 2 * FEED_CHUNK_SIZE
+    source = source_class()
+    articles = source.parse_page(data)
+    source.get_scopes = lambda: None
+    assert articles == source.parse_page(data)
+    assert articles
+
+
+@pytest.mark.parametrize("encoding,meta", CHARSETS)
+def test_declared_charset_is_used(encoding, meta):
+    data = make_page(TAKUNGPAO, encoding, meta)
+    assert TaKungPao().parse_page(data)[0] == {
+        "title": "頭條新聞",
+        "url": "http://www.takungpao.com.hk/1.html",
+        "abstract": "簡介 <一>",
+    }
+
+
+@pytest.mark.parametrize("encoding,meta", CHARSETS)
+@pytest.mark.parametrize("source_class,content", SOURCES)
+def test_selected_nodes_same_as_from_full_dom(source_class, content, encoding, meta):
+    data = make_page(content, encoding, meta)
+    source = source_class()
+    doc = extract_html(data, source.get_scopes(), source.get_max_scopes())
+    for selector in source.get_selectors():
+        assert serialize(selector.items(doc)) == serialize(
+            selector.items(full_dom(data))
+        )
+
+
+@pytest.mark.parametrize("encoding,meta", CHARSETS)
+def test_oriental_daily_nodes_same_as_from_full_dom(encoding, meta):
+    data = make_page(ORIENTALDAILY_PAGE, encoding, meta)
+    doc = extract_html(data, ORIENTALDAILY_SCOPES)
+    nodes = serialize(ORIENTALDAILY_ARTICLES(doc))
+    assert nodes == serialize(ORIENTALDAILY_ARTICLES(full_dom(data)))
+    assert len(nodes) == 2
+
+
+def test_max_scopes_stops_early():
+    data = make_page(HKEJ_PAGE + FILLER + TAKUNGPAO, "utf-8", "")
+    scopes = HKEJ().get_scopes() + TaKungPao().get_scopes()
+    assert len(extract_html(data, scopes)[0]) == 3
+    assert len(extract_html(data, scopes, max_scopes=1)[0]) == 1
+
+
+def test_encoding_overrides_the_declared_one():
+    # a page declaring utf-8 but sent as big5
+    data = make_page(TAKUNGPAO, "big5", '<meta charset="utf-8">')
+    doc = extract_html(data, [Scope("div", "class", "list_tuwen")], encoding="big5")
+    assert "頭條新聞" in etree.tostring(doc, encoding="unicode")
+
+
+def test_rfa_same_as_with_soupparser(monkeypatch):
+    # RFACantonese parsed its pages with BeautifulSoup before
+    soupparser = pytest.importorskip("lxml.html.soupparser")
+    data = make_page(RFA_PAGE, "utf-8", '<meta charset="utf-8">')
+    source = RFACantonese()
+    articles = source.parse_page(data)
+    source.get_scopes = lambda: None
+    monkeypatch.setattr(base.lxml_html, "document_fromstring", soupparser.fromstring)
+    assert articles == source.parse_page(data)
+    assert [article["url"][-1] for article in articles] == ["1", "2", "3", "4"]
@@ -0,0 +1,241 @@
+import html
+import io
+
+import pytest
+from lxml import etree
+
+from sources.feeds import iter_feed
+
+# the parsers iter_feed replaced, kept to check that the output didn't change
+
+RSS_TITLE = etree.XPath("title")
+RSS_LINK = etree.XPath("link")
+RSS_DESCRIPTION = etree.XPath("description")
+RDF_TITLE = etree.XPath('*[local-name()="title"]')
+RDF_LINK = etree.XPath('*[local-name()="link"]')
+RDF_DESCRIPTION = etree.XPath('*[local-name()="description"]')
+
+
+def legacy_iter_feed_items(data, tag, parent, max_items=None):
+    count = 0
+    for _, elem in etree.iterparse(
+        io.BytesIO(data), events=("end",), tag=tag, recover=True
+    ):
+        container = elem.getparent()
+        if container is None or etree.QName(container).localname != parent:
+            continue
+        yield elem
+        count += 1
+        elem.clear(keep_tail=True)
+        while elem.getprevious() is not None:
+            del container[0]
+        if max_items is not None and count >= max_items:
+            return
+
+
+def legacy_parse_rss(source, data):
+    result_list = []
+    for entry in legacy_iter_feed_items(
+        data, "item", "channel", source.get_max_items_per_section()
+    ):
+        title = RSS_TITLE(entry)[0].text
+        link = RSS_LINK(entry)[0].text
+        abstract = html.unescape(RSS_DESCRIPTION(entry)[0].text)
+        result_list.append(source.create_article(title.strip(), link, abstract))
+    return result_list
+
+
+def legacy_parse_rdf(source, data):
+    result_list = []
+    for entry in legacy_iter_feed_items(
+        data, "{*}item", "RDF", source.get_max_items_per_section()
+    ):
+        titles = RDF_TITLE(entry)
+        links = RDF_LINK(entry)
+        abstracts = RDF_DESCRIPTION(entry)
+        if titles and links:
+            title = titles[0].text
+            link = links[0].text
+            abstract = abstracts[0].text if abstracts else ""
+            result_list.append(source.create_article(title.strip(), link, abstract))
+    return result_list
+
+
+RSS_FEED = """<?xml version="1.0" encoding="utf-8"?>
+<rss version="2.0" xmlns:atom="http://www.w3.org/2005/Atom">
+<channel>
+<title>News</title>
+<link>https://example.com/</link>
+<description>Channel description, not an item</description>
+<atom:link href="https://example.com/feed" rel="self"/>
+<item>
+<title>  港聞：頭條  </title>
+<link>https://example.com/1</link>
+<description><![CDATA[<p>First &amp; <b>bold</b></p>]]></description>
+<guid>1</guid>
+<pubDate>Sun, 18 Oct 2026 08:00:00 +0000</pubDate>
+</item>
+<item>
+<title>Second &amp; last</title>
+<link>https://example.com/2</link>
+<description>Caf&amp;eacute; &amp;lt;tag&amp;gt;</description>
+</item>
+<item>
+<title>Third</title>
+<link>https://example.com/3</link>
+<description>3</description>
+</item>
+</channel>
+</rss>
+""".encode()
+
+RDF_FEED = b"""<?xml version="1.0" encoding="utf-8"?>
+<rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#"
+    xmlns="http://purl.org/rss/1.0/" xmlns:dc="http://purl.org/dc/elements/1.1/">
+<channel rdf:about="https://example.com/">
+<title>News</title>
+<link>https://example.com/</link>
+<items><rdf:Seq><rdf:li rdf:resource="https://example.com/1"/></rdf:Seq></items>
+</channel>
+<item rdf:about="https://example.com/1">
+<title> One </title>
+<link>https://example.com/1</link>
+<description>First</description>
+<dc:date>2026-10-18T08:00:00Z</dc:date>
+</item>
+<item rdf:about="https://example.com/2">
+<title>Two</title>
+<link>https://example.com/2</link>
+</item>
+<item rdf:about="https://example.com/3">
+<title>No link</title>
+</item>
+</rdf:RDF>
+"""
+
+RSS090_FEED = b"""<?xml version="1.0"?>
+<rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#"
+    xmlns="http://my.netscape.com/rdf/simple/0.9/">
+<channel><title>News</title><link>https://example.com/</link></channel>
+<item><title>Old</title><link>https://example.com/old</link></item>
+</rdf:RDF>
+"""
+
+ATOM_FEED = b"""<?xml version="1.0" encoding="utf-8"?>
+<feed xmlns="http://www.w3.org/2005/Atom">
+<title>News</title>
+<link href="https://example.com/"/>
+<entry>
+<title>One</title>
+<link rel="edit" href="https://example.com/edit/1"/>
+<link href="https://example.com/1"/>
+<id>urn:1</id>
+<updated>2026-10-18T09:00:00Z</updated>
+<published>2026-10-18T08:00:00Z</published>
+<summary>First &amp;amp; only</summary>
+</entry>
+<entry>
+<title>Two</title>
+<link rel="alternate" href="https://example.com/2"/>
+<updated>2026-10-18T10:00:00Z</updated>
+</entry>
+</feed>
+"""
+
+
+@pytest.mark.parametrize("max_items", [None, 2])
+def test_rss_output_unchanged(max_items, make_feeds):
+    source = make_feeds(max_items=max_items)
+    assert source.parse_feed(RSS_FEED) == legacy_parse_rss(source, RSS_FEED)
+
+
+def test_truncated_rss_output_unchanged(make_feeds):
+    # cut in the middle of the last description: recover mode keeps what was read
+    data = RSS_FEED[: RSS_FEED.index(b"<description>3") + 14]
+    source = make_feeds()
+    articles = source.parse_feed(data)
+    assert articles == legacy_parse_rss(source, data)
+    assert [article["url"] for article in articles] == [
+        "https://example.com/1",
+        "https://example.com/2",
+        "https://example.com/3",
+    ]
+
+
+def test_item_truncated_before_its_link_is_skipped(make_feeds):
+    data = RSS_FEED[: RSS_FEED.index(b"<title>Third") + 10]
+    # the whole section was lost before
+    with pytest.raises(IndexError):
+        legacy_parse_rss(make_feeds(), data)
+    assert len(make_feeds().parse_feed(data)) == 2
+
+
+def test_broken_rss_output_unchanged(make_feeds):
+    # a bare & and an unclosed tag, as found in hand-made feeds
+    data = RSS_FEED.replace(b"Second &amp; last", b"Second & last").replace(
+        b"<description>3</description>", b"<description>3<br></description>"
+    )
+    source = make_feeds()
+    assert source.parse_feed(data) == legacy_parse_rss(source, data)
+
+
+@pytest.mark.parametrize("data", [RDF_FEED, RSS090_FEED])
+def test_rdf_output_unchanged(data, make_feeds):
+    source = make_feeds()
+    articles = source.parse_feed(data)
+    legacy = legacy_parse_rdf(source, data)
+    # a missing description was "" before and is None now, like in other dialects
+    for article in legacy:
+        article["abstract"] = article["abstract"] or None
+    assert articles == legacy
+    assert articles
+
+
+def test_rdf_abstracts_are_unescaped(make_feeds):
+    data = RDF_FEED.replace(b"<description>First", b"<description>&amp;lt;First")
+    assert make_feeds().parse_feed(data)[0]["abstract"] == "<First"
+
+
+def test_rss_item_without_description_is_kept(make_feeds):
+    data = RSS_FEED.replace(b"<description>3</description>", b"")
+    with pytest.raises(IndexError):
+        legacy_parse_rss(make_feeds(), data)
+    assert make_feeds().parse_feed(data)[-1] == {
+        "title": "Third",
+        "url": "https://example.com/3",
+        "abstract": None,
+    }
+
+
+def test_atom_entries(make_feeds):
+    entries = list(iter_feed(ATOM_FEED))
+    assert entries == [
+        {
+            "title": "One",
+            "link": "https://example.com/1",
+            "description": "First &amp; only",
+            "guid": "urn:1",
+            "published": "2026-10-18T08:00:00Z",
+        },
+        {
+            "title": "Two",
+            "link": "https://example.com/2",
+            "description": None,
+            "guid": None,
+            "published": "2026-10-18T10:00:00Z",
+        },
+    ]
+    assert make_feeds().parse_feed(ATOM_FEED)[0]["abstract"] == "First & only"
+
+
+def test_rdf_entries_carry_guid_and_date():
+    entry = next(iter_feed(RDF_FEED))
+    assert entry["guid"] == "https://example.com/1"
+    assert entry["published"] == "2026-10-18T08:00:00Z"
+
+
+def test_not_a_feed():
+    assert (
+        list(iter_feed(b"<html><body><item><title>x</title></item></body></html>"))
+        == []
+    )
@@ -0,0 +1,114 @@
+import pytest
+
+import cache
+import refresher
+from cache import ArticleCache
+from refresher import REFRESH_BACKOFF, REFRESH_BACKOFF_MAX, Refresher
+
+pytestmark = pytest.mark.clock(cache, refresher)
+
+ARTICLES = [{"title": "News"}, {"title": "A", "url": "https://x/a"}]
+
+
+class InlineExecutor:
+    def submit(self, fn, *args):
+        fn(*args)
+
+    def shutdown(self, **kwargs):
+        pass
+
+
+class Source:
+    def __init__(self, clock):
+        self.clock = clock
+        self.scrapes = []
+        self.result = [{"title": "News"}]
+
+    def get_cache_ttl(self):
+        return 900
+
+    def get_articles(self):
+        self.scrapes.append(self.clock.now)
+        if isinstance(self.result, Exception):
+            raise self.result
+        return self.result
+
+
+def make_refresher(clock, source):
+    the_refresher = Refresher({"src": source}, ArticleCache(), tick=30)
+    the_refresher._executor = InlineExecutor()
+    return the_refresher
+
+
+def run_ticks(clock, the_refresher, seconds, tick=30):
+    end = clock.now + seconds
+    while clock.now < end:
+        the_refresher._refresh_due()
+        clock.now += tick
+
+
+def test_empty_scrapes_back_off(clock):
+    source = Source(clock)
+    the_refresher = make_refresher(clock, source)
+    run_ticks(clock, the_refresher, 8 * 60)
+    # 0, then 60s, 120s and 240s after each failure; not every 30s tick
+    assert [t - 1000 for t in source.scrapes] == [0, 60, 180, 420]
+    assert the_refresher.get_stats()["failed"] == 4
+    assert the_refresher.get_stats()["backing_off"] == 1
+
+
+def test_errors_back_off(clock):
+    source = Source(clock)
+    source.result = IOError("down")
+    the_refresher = make_refresher(clock, source)
+    run_ticks(clock, the_refresher, 4 * 60)
+    assert [t - 1000 for t in source.scrapes] == [0, 60, 180]
+
+
+def test_backoff_is_capped(clock):
+    source = Source(clock)
+    the_refresher = make_refresher(clock, source)
+    run_ticks(clock, the_refresher, 6 * 3600, tick=60)
+    gaps = [b - a for a, b in zip(source.scrapes, source.scrapes[1:])]
+    assert gaps[0] == REFRESH_BACKOFF
+    assert max(gaps) == REFRESH_BACKOFF_MAX
+
+
+def test_on_stale_refresh_respects_backoff(clock):
+    source = Source(clock)
+    the_refresher = make_refresher(clock, source)
+    the_refresher.refresh("src")
+    the_refresher.refresh("src")
+    assert len(source.scrapes) == 1
+
+
+def test_success_resets_backoff(clock):
+    source = Source(clock)
+    the_refresher = make_refresher(clock, source)
+    run_ticks(clock, the_refresher, 4 * 60)
+    source.result = ARTICLES
+    run_ticks(clock, the_refresher, 4 * 60)
+    assert the_refresher.get_stats()["backing_off"] == 0
+    assert the_refresher.get_stats()["refreshed"] == 1
+    # cached now: next refresh only when the entry nears expiry
+    before = len(source.scrapes)
+    run_ticks(clock, the_refresher, 600)
+    assert len(source.scrapes) == before
+    source.result = [{"title": "News"}]
+    run_ticks(clock, the_refresher, 600)
+    # a fresh failure starts again from the base delay
+    assert source.scrapes[before + 1] - source.scrapes[before] == REFRESH_BACKOFF
+
+
+def test_scheduler_keeps_lru_order(clock):
+    # room for two results only
+    cache = ArticleCache(max_bytes=500)
+    cache.put("a", ARTICLES)
+    cache.put("b", ARTICLES)
+    cache.get("a", lambda: None)
+    the_refresher = Refresher({"a": None, "b": None}, cache, tick=30)
+    the_refresher._refresh_due()
+    cache.put("c", ARTICLES)
+    # b was read least recently, whatever order the scheduler looked at them in
+    assert cache.peek("a")[0] is not None
+    assert cache.peek("b")[0] is None
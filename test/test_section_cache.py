@@ -0,0 +1,60 @@
+import pytest
+
+import cache
+from cache import ArticleCache
+from refresher import has_articles
+from sources import base
+
+FEED = b"<rss><channel><item><title>A</title><link>https://x/a</link></item></channel></rss>"
+
+
+pytestmark = pytest.mark.clock(cache)
+
+LINKS = [("a", "https://example.com/a")]
+
+
+class Reads(list):
+    """Times at which the feed was fetched"""
+
+
+@pytest.fixture
+def reads(clock, monkeypatch):
+    monkeypatch.setattr(base, "_section_cache", ArticleCache())
+    reads = Reads()
+
+    def read_http_page(url, **kwargs):
+        reads.append(clock.now)
+        return FEED
+
+    monkeypatch.setattr(base, "read_http_page", read_http_page)
+    reads.clock = clock
+    return reads
+
+
+def run_refresher(source, clock, tick, duration):
+    """Refresh the source like Refresher._run does, ahead of expiry"""
+    articles = ArticleCache()
+    end = clock.now + duration
+    while clock.now < end:
+        _, expires_in = articles.peek("source")
+        if expires_in <= tick:
+            articles.refresh(
+                "source", source.get_articles, source.get_cache_ttl(), has_articles
+            )
+        clock.now += tick
+
+
+def test_refresh_ahead_of_expiry_reads_sections_again(reads, make_feeds):
+    run_refresher(make_feeds(LINKS, ttl=6), reads.clock, tick=2, duration=20)
+    # one read per refresh: at 0, 4, 8, 12 and 16s
+    assert [now - 1000 for now in reads] == [0, 4, 8, 12, 16]
+
+
+def test_longer_section_ttl_is_reused_within_it(reads, make_feeds):
+    run_refresher(
+        make_feeds(LINKS, ttl=6, section_ttl=24), reads.clock, tick=2, duration=40
+    )
+    intervals = [b - a for a, b in zip(reads, reads[1:])]
+    # reused while it stays fresh for a whole source TTL, so never older than 24s
+    assert intervals and all(interval <= 24 for interval in intervals)
+    assert len(reads) < 10
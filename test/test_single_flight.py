@@ -0,0 +1,200 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import main
+from cache import ArticleCache, SingleFlight
+
+
+@pytest.fixture
+def executor():
+    with ThreadPoolExecutor(4) as executor:
+        yield executor
+
+
+class Gated:
+    """An iteration that produces its next item each time the gate is opened"""
+
+    def __init__(self, items):
+        self.items = items
+        self.calls = 0
+        self.gate = threading.Semaphore(0)
+
+    def __call__(self):
+        self.calls += 1
+        for item in self.items:
+            self.gate.acquire()
+            yield item
+
+
+def test_do_shares_one_call(executor):
+    flight = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def slow():
+        calls.append(1)
+        started.set()
+        release.wait()
+        return "value"
+
+    first = executor.submit(flight.do, "key", slow)
+    started.wait()
+    second = executor.submit(flight.do, "key", slow)
+    time.sleep(0.05)
+    release.set()
+    assert first.result() == second.result() == "value"
+    assert len(calls) == 1
+    assert flight.get_stats() == {"calls": 2, "shared": 1}
+
+
+def test_streams_share_one_iteration(executor):
+    flight = SingleFlight()
+    produce = Gated([1, 2, 3])
+    leader = flight.stream("key", produce, executor.submit)
+    produce.gate.release()
+    assert next(leader) == 1
+    # joins after the first item: gets it, then follows along
+    follower = flight.stream("key", produce, executor.submit)
+    assert next(follower) == 1
+    produce.gate.release()
+    produce.gate.release()
+    assert list(leader) == [2, 3]
+    assert list(follower) == [2, 3]
+    assert produce.calls == 1
+
+
+def test_stream_goes_on_when_the_leader_stops_reading(executor):
+    flight = SingleFlight()
+    produce = Gated([1, 2])
+    leader = flight.stream("key", produce, executor.submit)
+    produce.gate.release()
+    assert next(leader) == 1
+    follower = flight.stream("key", produce, executor.submit)
+    assert next(follower) == 1
+    leader.close()
+    produce.gate.release()
+    assert list(follower) == [2]
+
+
+def test_do_joining_a_stream_gets_its_items(executor):
+    flight = SingleFlight()
+    produce = Gated([1, 2])
+    stream = flight.stream("key", produce, executor.submit)
+    produce.gate.release()
+    assert next(stream) == 1
+    joined = executor.submit(flight.do, "key", lambda: "not called")
+    produce.gate.release()
+    assert joined.result() == [1, 2]
+    assert produce.calls == 1
+
+
+def test_stream_joining_a_do_gets_its_result(executor):
+    flight = SingleFlight()
+    release = threading.Event()
+    called = executor.submit(flight.do, "key", lambda: release.wait() and [1, 2])
+    time.sleep(0.05)
+    stream = flight.stream("key", Gated([3]), executor.submit)
+    release.set()
+    assert list(stream) == [1, 2]
+    assert called.result() == [1, 2]
+
+
+def test_stream_error_reaches_every_reader(executor):
+    flight = SingleFlight()
+    gate = threading.Event()
+
+    def broken():
+        yield 1
+        gate.wait()
+        raise IOError("down")
+
+    first = flight.stream("key", broken, executor.submit)
+    assert next(first) == 1
+    second = flight.stream("key", broken, executor.submit)
+    assert next(second) == 1
+    gate.set()
+    for stream in [first, second]:
+        with pytest.raises(IOError):
+            next(stream)
+
+
+def test_refused_stream_frees_the_key(executor):
+    flight = SingleFlight()
+
+    def refuse(fn):
+        raise RuntimeError("full")
+
+    with pytest.raises(RuntimeError):
+        next(flight.stream("key", Gated([1]), refuse))
+    assert flight.do("key", lambda: "again") == "again"
+
+
+def test_stream_not_started_in_time(executor):
+    flight = SingleFlight()
+    queued = []
+    with pytest.raises(TimeoutError):
+        next(flight.stream("key", Gated([1]), queued.append, timeout=0.05))
+
+
+def test_cache_stream_caches_accepted_results(executor):
+    cache = ArticleCache()
+    produce = Gated([{"title": "a"}])
+    produce.gate.release()
+    assert list(cache.stream("key", produce, executor.submit)) == [{"title": "a"}]
+    assert cache.peek("key")[0] == [{"title": "a"}]
+    assert list(cache.stream("key", produce, executor.submit)) == [{"title": "a"}]
+    assert produce.calls == 1
+    produce.gate.release()
+    rejected = cache.stream("other", produce, executor.submit, accept=lambda v: False)
+    assert list(rejected) == [{"title": "a"}]
+    assert cache.peek("other")[0] is None
+
+
+class SlowStream:
+    """A source whose scrape waits for the gate to open"""
+
+    def __init__(self):
+        self.scrapes = 0
+        self.gate = threading.Event()
+
+    def get_id(self):
+        return "test_slow_stream"
+
+    def get_cache_ttl(self):
+        return 900
+
+    def get_bulkhead(self):
+        return self.get_id()
+
+    def iter_articles(self):
+        self.scrapes += 1
+        for title in ["news", "a", "b"]:
+            self.gate.wait()
+            yield {"title": title, "url": "https://x/" + title}
+
+
+def test_concurrent_streams_share_one_scrape(monkeypatch):
+    monkeypatch.setattr(main.refresher, "start", lambda: None)
+    source = SlowStream()
+    monkeypatch.setitem(main.allSources, source.get_id(), source)
+
+    def read():
+        # called directly, as the app can't get new routes once it served a request
+        with main.app.test_request_context("/test_slow_stream?stream=1"):
+            return "".join(main.route_source().response)
+
+    try:
+        with ThreadPoolExecutor(4) as clients:
+            responses = [clients.submit(read) for _ in range(4)]
+            time.sleep(0.2)
+            source.gate.set()
+            bodies = [response.result() for response in responses]
+        assert source.scrapes == 1
+        assert len(set(bodies)) == 1
+        assert bodies[0].count("\n") == 3
+    finally:
+        main.article_cache.invalidate(source.get_id())